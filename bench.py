@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Headless render benchmark.
+
+Renders the same sweep of camera angles with each render backend and
+reports frame times, e.g.
+
+    python3 bench.py fork:8 spawn:8 thread:8
+"""
+
+import argparse
+import asyncio
+import ctypes
+import math
+import statistics
+import time
+from typing import List
+
+import game_map
+import lib_rq
+import rq_engine
+from graphics import BYTES_PER_PIX, Res, parse_cores
+
+
+def bench(
+    rq_map: game_map.Map,
+    spec: str,
+    res: Res,
+    frames: int,
+    accel: str = "field",
+    bytes_per_pix: int = BYTES_PER_PIX,
+) -> List[float]:
+    """Render frames with the backend in spec, returns each frame's time"""
+    camera = lib_rq.Camera
+    player = rq_map.player
+    camera.POSITION = [player.col + 0.5, 0.0, player.row + 0.5]
+    camera_size = ctypes.sizeof(camera)
+    kernel_args = rq_engine.KernelArgs(rq_map, accel)
+    dump = rq_map.byte_dump()
+    data_in = bytearray(camera_size) + dump + kernel_args.accel_data(rq_map, dump)
+    data_out = bytearray()
+
+    backend, cores = parse_cores(spec)
+    start = time.perf_counter()
+    with rq_engine.RenderEngine(
+        res,
+        cores,
+        len(data_in),
+        kernel_args,
+        backend,
+        bytes_per_pix,
+    ) as gpu:
+        print(f"{spec:>10} started in {(time.perf_counter() - start) * 1e3:.1f}ms")
+        # Time whole frames, not whatever finished inside the game's deadline
+        gpu.timeout = None
+        times = []
+        for i in range(frames + 1):
+            camera.FACING = [2 * math.pi * i / frames, 0.0, 0.0]
+            data_in[:camera_size] = bytearray(camera())
+            gpu(data_in, data_out)
+            times.append(gpu.render_time)
+    # The first frame pays for warming up the workers
+    return times[1:]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare render backends")
+    parser.add_argument(
+        "backends",
+        nargs="*",
+        default=["fork:8", "spawn:8", "thread:8"],
+        help="[fork|spawn|thread:]count, as taken by rq_engine --ncores",
+    )
+    parser.add_argument(
+        "--res",
+        default=str(Res.R256x144),
+        choices=[str(r) for r in Res],
+    )
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--accel", choices=rq_engine.ACCEL, default="field")
+    parser.add_argument("--indexed", action="store_true", help="Render palette indices")
+    optarg = parser.parse_args()
+
+    # Map and Camera expect an event loop to exist
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    rq_map = game_map.Map("maps/reversed_mst_campus.txt", seed=0)
+    res = {str(r): r for r in Res}[optarg.res]
+    for spec in optarg.backends:
+        times = bench(
+            rq_map,
+            spec,
+            res,
+            optarg.frames,
+            optarg.accel,
+            1 if optarg.indexed else BYTES_PER_PIX,
+        )
+        print(
+            f"{spec:>10} @{res} {optarg.accel} mean={statistics.mean(times) * 1e3:.2f}ms "
+            f"median={statistics.median(times) * 1e3:.2f}ms "
+            f"max={max(times) * 1e3:.2f}ms"
+        )
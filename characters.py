@@ -2,23 +2,75 @@
 # -*- coding: utf-8 -*-
 
 import math
-from typing import List
+from typing import List, Optional
 import random
 import rq_utils
 from rq_utils import KEY_DICT
 import ascii_art
 import collections
+import entity_registry
+import replay
+import rq_random
 
 
 class Entity:
     repr_char = " "
     color = ""
+    # Entities created outside a Map share the module-level RNG. The Map
+    # replaces this with the entity's own stream. Random moves have to come
+    # from here rather than the random module for a replay to repeat them.
+    rng: rq_random.Source = random
 
     def __init__(self, row: int, col: int) -> None:
-        self.row = row
-        self.col = col
+        self._row = row
+        self._col = col
+        # Spatial indexes to notify when this entity changes cell. Each one
+        # has a moved(entity, old_row, old_col) method.
+        self.trackers: List = []
+        # Stable id handed out by the Map, in spawn order
+        self.uid = -1
+        # Set by the EntityRegistry of the map that adds this entity
+        self.registry: Optional[entity_registry.EntityRegistry] = None
+        self.registry_slot: Optional[List[int]] = None
         self.active = True
         self.move_queue = collections.deque()
+        # A random move drawn ahead of time by the Map, used up by move()
+        self.next_wander: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    @active.setter
+    def active(self, active: bool) -> None:
+        self._active = active
+        # Deactivating is for good, so the registry can let go right away
+        if not active and self.registry is not None:
+            self.registry.discard(self)
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    @row.setter
+    def row(self, row: int) -> None:
+        old_row = self._row
+        self._row = row
+        if old_row != row:
+            for tracker in self.trackers:
+                tracker.moved(self, old_row, self._col)
+
+    @property
+    def col(self) -> int:
+        return self._col
+
+    @col.setter
+    def col(self, col: int) -> None:
+        old_col = self._col
+        self._col = col
+        if old_col != col:
+            for tracker in self.trackers:
+                tracker.moved(self, self._row, old_col)
 
     def char(self) -> str:
         return (" ", rq_utils.COLORS[self.color] + self.repr_char + "\033[0m")[
@@ -61,22 +113,30 @@ class Entity:
         """
         pass
     
+    def queue_move(self, direction: str):
+        if (rec := replay.recorder()) is not None:
+            rec.queue_move(self, direction)
+        self.move_queue.append(direction)
+
     def move_up(self):
-        self.move_queue.append(KEY_DICT["up"])
+        self.queue_move(KEY_DICT["up"])
     
     def move_down(self):
-        self.move_queue.append(KEY_DICT["down"])
+        self.queue_move(KEY_DICT["down"])
     
     def move_left(self):
-        self.move_queue.append(KEY_DICT["left"])
+        self.queue_move(KEY_DICT["left"])
     
     def move_right(self):
-        self.move_queue.append(KEY_DICT["right"])
+        self.queue_move(KEY_DICT["right"])
 
     def move(self) -> str:
         if self.move_queue:
             return self.move_queue.popleft()
-        return random.choice([m for m in KEY_DICT.values()])
+        if self.next_wander is not None:
+            wander, self.next_wander = self.next_wander, None
+            return wander
+        return self.rng.choice([m for m in KEY_DICT.values()])
 
 
 class Mask(Entity):
@@ -101,12 +161,12 @@ class Mask(Entity):
         Returns:    a string, the direction (KEY_DICT['direction']) that the calling Mask
                     object should move in
         Modifies:   nothing
-        Calls:      random.choice
+        Calls:      self.rng.choice
         """
         return super().move()
 
     def __str__(self) -> str:
-        mask_material = random.choice(
+        mask_material = self.rng.choice(
             [
                 "giant UV-light",
                 "plastic bag",
@@ -145,13 +205,13 @@ class PoliceDrone(Entity):
         Returns:    a string, the direction (KEY_DICT['direction']) that the calling
                     PoliceDrone object should move in
         Modifies:   nothing
-        Calls:      standard python, random.choice,
+        Calls:      standard python, self.rng.choice,
                     self._move_to_follow, self.distance
         """
         return super().move()
 
     def __str__(self) -> str:
-        return "PoliceDrone says: " + random.choice(
+        return "PoliceDrone says: " + self.rng.choice(
             [
                 "Throughout human history, we have been dependent on machines to survive.",
                 "If real is what you can feel, smell, taste and see, then 'real' is simply electrical signals interpreted by your brain.",
@@ -182,13 +242,13 @@ class AntiCipher(Entity):
         Returns:    a string, the direction (KEY_DICT['direction']) that the calling
                     AntiCipher object should move in
         Modifies:   nothing
-        Calls:      standard python, random.choice,
+        Calls:      standard python, self.rng.choice,
                     self._move_to_follow, self.distance
         """
         return super().move()
 
     def __str__(self) -> str:
-        return "AntiCipher says: " + random.choice(
+        return "AntiCipher says: " + self.rng.choice(
             [
                 "Ignorance is bliss.",
                 "Why oh why didn't I take the BLUE pill?",
@@ -200,14 +260,19 @@ class AntiCipher(Entity):
         )
 
 
+# Lists the live Smiths for AdminSmith.adminsmiths
+_live_smiths = entity_registry.LiveOfType()
+
+
 class AdminSmith(Entity):
     repr_char = "S"
     color = "yellow"
-    adminsmiths: List["AdminSmith"] = []
+    # Live Smiths of the same map, or those not in one
+    adminsmiths = _live_smiths
 
     def __init__(self, row: int, col: int) -> None:
         Entity.__init__(self, row, col)
-        AdminSmith.adminsmiths.append(self)
+        _live_smiths.made(self)
 
     def contact_dist(self) -> int:
         return 2
@@ -224,13 +289,13 @@ class AdminSmith(Entity):
         Returns:    a string, the direction (KEY_DICT['direction']) that the calling
                     AdminSmith object should move in
         Modifies:   nothing
-        Calls:      standard python, random.choice,
+        Calls:      standard python, self.rng.choice,
                     self._move_to_follow, self.distance
         """
         return super().move()
 
     def __str__(self) -> str:
-        return "AdminSmith says: " + random.choice(
+        return "AdminSmith says: " + self.rng.choice(
             [
                 "Never send a human to do a machine's job.",
                 "I hate this place. This zoo. This prison. This reality, whatever you want to call it, I can't stand it any longer.",
@@ -293,7 +358,7 @@ class The0racle(Entity):
         pass
 
     def __str__(self) -> str:
-        return "The0racle says ays: " + random.choice(
+        return "The0racle says ays: " + self.rng.choice(
             [
                 "Everything That Has A Beginning Has An End.",
                 "You Just Have To Make Up Your Own Damn Mind...",
@@ -319,7 +384,7 @@ class The1(Entity):
         print()
         return (
             "The1 says: "
-            + random.choice(
+            + self.rng.choice(
                 [
                     "Ever have that feeling where you’re not sure if you’re awake or dreaming?",
                     "I don't like the idea that I'm not in control of my life.",
@@ -351,7 +416,7 @@ class VaccineDrive(Entity):
         self.active = False
 
     def __str__(self) -> str:
-        return "Vaccine drive label says: " + random.choice(
+        return "Vaccine drive label says: " + self.rng.choice(
             [
                 "Do not try and bend the virus, that is impossible. Instead, only try to realize the truth. There is no virus. Then you'll see that it is not the virus that infects, it is only yourself."
                 "The function of the 1 is now to return to the source, allowing a temporary dissemination of the code you carry, reinserting the prime program.",
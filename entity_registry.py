@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Registry of live entities.
+
+Entities are kept in dense lists, one of every live entity and one per
+type, so nothing that iterates them has to skip dead ones. Each entity
+remembers its slot in both lists; taking it out moves the last entity of
+each list into the hole, so deactivating is O(1) and no list is rebuilt.
+
+Each Map has a registry of its own, and an entity joins it when the map
+adds it; a new map starts from an empty registry.
+"""
+
+import weakref
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from characters import Entity
+
+# Fields of Entity.registry_slot
+INDEX, TYPE_INDEX = range(2)
+
+
+class EntityRegistry:
+    def __init__(self) -> None:
+        self.live: List["Entity"] = []
+        self._of_type: Dict[type, List["Entity"]] = {}
+        self._removed: List["Entity"] = []
+
+    def registered(self, entity: "Entity") -> bool:
+        return entity.registry is self and entity.registry_slot is not None
+
+    def register(self, entity: "Entity") -> None:
+        if self.registered(entity):
+            return
+        of_type = self.of_type(type(entity))
+        entity.registry = self
+        entity.registry_slot = [len(self.live), len(of_type)]
+        self.live.append(entity)
+        of_type.append(entity)
+
+    def discard(self, entity: "Entity") -> None:
+        """Take entity out of the live lists; unregistered entities are ignored"""
+        slot = entity.registry_slot
+        if slot is None or entity.registry is not self:
+            return
+        self._swap_remove(self.live, slot[INDEX], INDEX)
+        self._swap_remove(self._of_type[type(entity)], slot[TYPE_INDEX], TYPE_INDEX)
+        entity.registry_slot = None
+        self._removed.append(entity)
+
+    @staticmethod
+    def _swap_remove(entities: List["Entity"], index: int, field: int) -> None:
+        last = entities.pop()
+        if index < len(entities) and last.registry_slot is not None:
+            entities[index] = last
+            last.registry_slot[field] = index
+
+    def of_type(self, cls: type) -> List["Entity"]:
+        """
+        Live entities of exactly type cls. The list is the registry's own and
+        stays current; copy it before deactivating entities while iterating.
+        """
+        return self._of_type.setdefault(cls, [])
+
+    def take_removed(self) -> List["Entity"]:
+        """Entities discarded since the last call"""
+        removed, self._removed = self._removed, []
+        return removed
+
+
+class LiveOfType:
+    """
+    Attribute listing the live instances of the class it's read from. Read
+    from an entity in a map, it's the list kept by that map's registry.
+    Otherwise it's the instances no map has taken in, e.g. ones a test made;
+    the class adds them with made() as they're created.
+    """
+
+    def __init__(self) -> None:
+        self._made: "weakref.WeakSet[Entity]" = weakref.WeakSet()
+
+    def made(self, entity: "Entity") -> None:
+        self._made.add(entity)
+
+    def __get__(self, obj: Optional["Entity"], cls: type) -> List["Entity"]:
+        if obj is not None and obj.registry is not None:
+            return obj.registry.of_type(cls)
+        return [
+            entity
+            for entity in self._made
+            if type(entity) is cls and entity.registry is None and entity.active
+        ]
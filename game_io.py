@@ -6,6 +6,7 @@ import tkinter as tk
 from typing import Callable, List
 from characters import Entity
 import asyncio
+import replay
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,8 @@ class Button(enum.IntEnum):
 
 def debug(f):
     def inner(self, button, *args):
-        logger.debug(f"{type(self).__name__}.{f.__name__}({button}, *args)")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s.%s(%s)", type(self).__name__, f.__name__, button)
         return f(self, button, *args)
 
     return inner
@@ -61,6 +63,9 @@ class EventPlayer:
         self.held_buttons = 0
         self.entity = entity
         self.velocity = 0.5
+        # nearby_walls() of the cell it was last asked about
+        self._walls_cell = None
+        self._walls = set()
         self.id = type(self).id
         self.map = map
         type(self).id += 1
@@ -97,42 +102,46 @@ class EventPlayer:
         self.entity.col = int(v)
 
 
-    async def move(self, condition: Callable[[], bool]):
-        map = self.map
-        prev_walls = {
-            (self.row + i, self.col + j)
-            for i, j in DIRECTIONS
-            if chr(map.protomap[self.row + i][self.col + j]) in Map.WALL_CHAR
-            or chr(map.protomap[self.row + i][self.col + j]) in Map.BOUND_CHAR
-        }
-        prev_row = self.position[2]
-        prev_col = self.position[0]
+    def nearby_walls(self):
+        """Wall and boundary cells around the current cell"""
+        cell = (self.row, self.col)
+        # Steps are much smaller than a cell, so most stay in the same one
+        if cell != self._walls_cell:
+            protomap = self.map.protomap
+            self._walls_cell = cell
+            self._walls = {
+                (self.row + i, self.col + j)
+                for i, j in DIRECTIONS
+                if chr(protomap[self.row + i][self.col + j]) in Map.WALL_CHAR
+                or chr(protomap[self.row + i][self.col + j]) in Map.BOUND_CHAR
+            }
+        return self._walls
+
+    def step(self) -> bool:
+        """Advance one movement tick. Returns False if a wall was in the way"""
+        rad = self.facing_direction[0]
+        n_x, n_y = self.position[0], self.position[2]
+
+        n_x += math.cos(rad) * self.velocity * self.throttle[2]
+        n_y -= math.sin(rad) * self.velocity * self.throttle[2]
+        n_x += math.cos(rad + math.pi / 2) * self.velocity * self.throttle[0]
+        n_y -= math.sin(rad + math.pi / 2) * self.velocity * self.throttle[0]
+
+        # check collision
+        if (int(n_y), int(n_x)) in self.nearby_walls():
+            return False
+        self.position[2] = n_y
+        self.position[0] = n_x
+        # sync so map.pretty_print shows upated position
+        self.syncup()
+        return True
 
+    async def move(self, condition: Callable[[], bool]):
         while condition():
             await asyncio.sleep(1 / 60)
-            rad = self.facing_direction[0]
-            
-            n_x, n_y = prev_col, prev_row
-
-            n_x += math.cos(rad) * self.velocity * self.throttle[2]
-            n_y -= math.sin(rad) * self.velocity * self.throttle[2]
-            n_x += math.cos(rad + math.pi / 2) * self.velocity * self.throttle[0]
-            n_y -= math.sin(rad + math.pi / 2) * self.velocity * self.throttle[0]
-
-            # check collision
-            if (int(n_y), int(n_x)) in prev_walls:
-                continue
-            else:
-                prev_row = self.position[2] = n_y
-                prev_col = self.position[0] = n_x
-                prev_walls = set(
-                    (self.row + i, self.col + j)
-                    for i, j in DIRECTIONS
-                    if chr(map.protomap[self.row + i][self.col + j]) in Map.WALL_CHAR
-                    or chr(map.protomap[self.row + i][self.col + j]) in Map.BOUND_CHAR
-                )
-                # sync so map.pretty_print shows upated position
-                self.syncup()
+            if (rec := replay.recorder()) is not None:
+                rec.step(self)
+            self.step()
     
     def start_forcing_throttle(self, throttle):
         self._throttle_forced = True
@@ -149,16 +158,18 @@ class EventPlayer:
         if self._throttle_forced:
             return
         self.throttle[index] = value
-        logger.debug(f"throttle: {self.throttle}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("throttle: %s", self.throttle)
 
     def set_button(self, button: Button, state: bool):
         if state:
             self.held_buttons |= button
         else:
             self.held_buttons &= ~button
-        logger.debug(
-            f"is_button_held({str(button)}) -> " f"{bool(self.held_buttons & button)}"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "is_button_held(%s) -> %s", button, bool(self.held_buttons & button)
+            )
 
     @property
     def on_next(self):
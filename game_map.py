@@ -4,21 +4,339 @@
 import time
 import random
 import math
-from typing import List, Tuple, Dict, Callable
-from collections import defaultdict
+import contextlib
+import io
+from array import array
+from typing import List, Tuple, Dict, Callable, Iterable, Optional
+from collections import OrderedDict, defaultdict, deque
 import characters
+import entity_registry
+import pathfinding
+import visibility
 import rq_utils
+import term_io
 from rq_utils import KEY_DICT
 import ctypes
 import logging
+import replay
+import rq_random
 
 logger = logging.getLogger(__name__)
+# Contacts repeat every tick for as long as an entity stays in range
+logger.addFilter(rq_utils.RateLimit())
+
+
+class FreeCellIndex:
+    """Flat array of every walkable (' ') cell, built once at load"""
+
+    def __init__(self, lines: List[str]) -> None:
+        self.width = len(lines[0])
+        # Cells are stored flattened as row * width + col
+        self.cells = array(
+            "I",
+            (
+                i * self.width + j
+                for i, line in enumerate(lines)
+                for j, ch in enumerate(line)
+                if ch == " "
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def sampler(
+        self,
+        min_spacing: int = 0,
+        reserved: Iterable[Tuple[int, int]] = (),
+        rng: rq_random.Source = random,
+    ) -> "CellSampler":
+        return CellSampler(self, min_spacing, reserved, rng)
+
+
+class CellSampler:
+    """
+    Draws cells from a FreeCellIndex without replacement.
+
+    A partial Fisher-Yates shuffle over a private copy of the index, so each
+    draw is O(1) no matter how crowded the map is. Cells that are rejected
+    (reserved, or too close to an earlier pick) can never become valid again,
+    so they are consumed as well.
+    """
+
+    def __init__(
+        self,
+        index: FreeCellIndex,
+        min_spacing: int,
+        reserved: Iterable[Tuple[int, int]],
+        rng: rq_random.Source,
+    ) -> None:
+        self._width = index.width
+        self._pool = array("I", index.cells)
+        self._cursor = 0
+        self._rng = rng
+        self._spacing = min_spacing
+        self._reserved = {i * self._width + j for i, j in reserved}
+        # Accepted cells bucketed by (row // spacing, col // spacing), so the
+        # spacing test only needs to look at the 3x3 neighbouring buckets
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, int]]] = defaultdict(
+            list
+        )
+
+    def _spaced(self, row: int, col: int) -> bool:
+        s = self._spacing
+        b_i, b_j = row // s, col // s
+        for n_i in (b_i - 1, b_i, b_i + 1):
+            for n_j in (b_j - 1, b_j, b_j + 1):
+                for o_row, o_col in self._buckets.get((n_i, n_j), ()):
+                    if abs(o_row - row) < s and abs(o_col - col) < s:
+                        return False
+        return True
+
+    def take(self, count: int) -> List[Tuple[int, int]]:
+        """
+        Purpose:    Picks count distinct free cells uniformly at random,
+                    skipping reserved cells and, if min_spacing is set, any
+                    cell closer than min_spacing (Chebyshev) to an earlier pick
+        Parameters: count, the number of cells to pick, as int
+        User Input: no
+        Prints:     nothing
+        Returns:    the picked cells as a list of (row, col) tuples
+        Modifies:   the sampler's pool
+        Calls:      standard python
+        """
+        pool, rand, width = self._pool, self._rng.random, self._width
+        size = len(pool)
+        picked: List[Tuple[int, int]] = []
+        while len(picked) < count:
+            start = self._cursor
+            stop = min(size, start + count - len(picked))
+            if start == stop:
+                raise ValueError(
+                    f"ran out of free cells after {len(picked)} of {count} spawns"
+                )
+            # Shuffle the next block into place, then filter it. Rejected cells
+            # are simply topped up by the next block.
+            for cursor in range(start, stop):
+                swap = cursor + int(rand() * (size - cursor))
+                cell = pool[swap]
+                pool[swap] = pool[cursor]
+                pool[cursor] = cell
+            self._cursor = stop
+            for cell in pool[start:stop]:
+                if cell in self._reserved:
+                    continue
+                row, col = divmod(cell, width)
+                if self._spacing > 1:
+                    if not self._spaced(row, col):
+                        continue
+                    self._buckets[
+                        row // self._spacing, col // self._spacing
+                    ].append((row, col))
+                picked.append((row, col))
+        return picked
+
+
+class ChunkIndex:
+    """Which entities stand in which chunk, kept current as they move"""
+
+    def __init__(self, chunk_rows: int, chunk_cols: int) -> None:
+        self.chunk_rows = chunk_rows
+        self.chunk_cols = chunk_cols
+        # Dicts rather than sets so iteration follows insertion order
+        self._chunks: Dict[Tuple[int, int], Dict[characters.Entity, None]] = (
+            defaultdict(dict)
+        )
+
+    def key(self, row: int, col: int) -> Tuple[int, int]:
+        return row // self.chunk_rows, col // self.chunk_cols
+
+    def get(self, chunk_i: int, chunk_j: int) -> Iterable[characters.Entity]:
+        return self._chunks.get((chunk_i, chunk_j), {}).keys()
+
+    def add(self, entity: characters.Entity) -> None:
+        self._chunks[self.key(entity.row, entity.col)][entity] = None
+        entity.trackers.append(self)
+
+    def discard(self, entity: characters.Entity) -> None:
+        if self in entity.trackers:
+            entity.trackers.remove(self)
+            self._chunks[self.key(entity.row, entity.col)].pop(entity, None)
+
+    def moved(self, entity: characters.Entity, old_row: int, old_col: int) -> None:
+        old_key = self.key(old_row, old_col)
+        new_key = self.key(entity.row, entity.col)
+        if old_key != new_key:
+            self._chunks[old_key].pop(entity, None)
+            self._chunks[new_key][entity] = None
+
+
+# Byte -> 1 for anything a ray could stop at, 0 for open ground
+_SOLID = bytes(0 if byte == ord(" ") else 1 for byte in range(256))
+
+
+class DistanceField:
+    """
+    Chebyshev distance from each cell of a ByteMap to the nearest non-blank
+    cell (wall, label, entity) or edge of the map, capped at MAX.
+
+    A ray sampled in a cell at distance d can advance d cells without passing
+    through anything it could hit, so open ground is crossed in strides
+    instead of a cell at a time.
+
+    Rows are worked on as integers with a byte per cell, so growing the solid
+    cells by one in every direction is a few shifts and ors per row. Entity
+    moves mark rows dirty and only the rows they can affect are rebuilt on
+    the next update.
+    """
+
+    MAX = 8
+
+    def __init__(self, rows: int, cols: int) -> None:
+        self.rows, self.cols = rows, cols
+        self.field = bytearray(rows * cols)
+        self._ones = int.from_bytes(b"\x01" * cols, "little")
+        # Beyond the first and last column counts as solid
+        self._edges = 1 | (1 << 8 * (cols - 1))
+        # Inclusive range of rows whose solid cells changed, if any
+        self._dirty: Optional[Tuple[int, int]] = (0, rows - 1)
+
+    def touch(self, row: int) -> None:
+        if self._dirty is None:
+            self._dirty = row, row
+        else:
+            lo, hi = self._dirty
+            self._dirty = min(lo, row), max(hi, row)
+
+    def add(self, entity: characters.Entity) -> None:
+        self.touch(entity.row)
+        entity.trackers.append(self)
+
+    def discard(self, entity: characters.Entity) -> None:
+        if self in entity.trackers:
+            entity.trackers.remove(self)
+            self.touch(entity.row)
+
+    def moved(self, entity: characters.Entity, old_row: int, old_col: int) -> None:
+        self.touch(old_row)
+        self.touch(entity.row)
+
+    def update(self, dump: bytearray) -> bytearray:
+        """Bring the field up to date with a byte_dump, returns the field"""
+        if self._dirty is None:
+            return self.field
+        lo, hi = self._dirty
+        self._dirty = None
+        rows, cols, ones, edges = self.rows, self.cols, self._ones, self._edges
+        # Changed solid rows can move the field up to MAX - 1 rows away, and
+        # those rows in turn depend on solid rows up to MAX - 1 further out
+        reach = self.MAX - 1
+        out_lo, out_hi = max(0, lo - reach), min(rows - 1, hi + reach)
+        in_lo, in_hi = max(0, out_lo - reach), min(rows - 1, out_hi + reach)
+        # Past the map is solid. Past the band is unknown, taken as open,
+        # which only skews rows outside out_lo..out_hi
+        above = ones if in_lo == 0 else 0
+        below = ones if in_hi == rows - 1 else 0
+
+        grown = [
+            int.from_bytes(
+                dump[y * cols : (y + 1) * cols].translate(_SOLID), "little"
+            )
+            for y in range(in_lo, in_hi + 1)
+        ]
+        last = len(grown) - 1
+        # A cell's distance is the number of growth steps that don't cover it
+        total = [0] * len(grown)
+        for step in range(self.MAX):
+            for y, solid in enumerate(grown):
+                total[y] += ones ^ solid
+            if step == self.MAX - 1:
+                break
+            # Grow by one row up and down, then one column left and right
+            next_grown = []
+            for y, solid in enumerate(grown):
+                m = solid | (grown[y - 1] if y else above)
+                m |= grown[y + 1] if y < last else below
+                next_grown.append(m | ((m << 8) & ones) | (m >> 8) | edges)
+            grown = next_grown
+
+        for y in range(out_lo, out_hi + 1):
+            self.field[y * cols : (y + 1) * cols] = total[y - in_lo].to_bytes(
+                cols, "little"
+            )
+        return self.field
+
+
+class OccupancyPyramid:
+    """
+    Which blocks of a ByteMap hold anything a ray could stop at, at 16x16
+    and 4x4 blocks. The map itself is the 1x1 level.
+
+    data holds a byte per block, 1 if occupied, for each level coarsest
+    first as laid out by layout(). Walls are counted once at load, entities
+    as they come, go and move, so the flags never need rebuilding.
+    """
+
+    SHIFTS = (4, 2)
+
+    @classmethod
+    def layout(cls, rows: int, cols: int) -> List[Tuple[int, int, int]]:
+        """(shift, offset into data, blocks per row) of each level"""
+        levels, offset = [], 0
+        for shift in cls.SHIFTS:
+            size = 1 << shift
+            stride = (cols + size - 1) >> shift
+            levels.append((shift, offset, stride))
+            offset += stride * ((rows + size - 1) >> shift)
+        return levels
+
+    @classmethod
+    def size(cls, rows: int, cols: int) -> int:
+        shift, offset, stride = cls.layout(rows, cols)[-1]
+        return offset + stride * ((rows + (1 << shift) - 1) >> shift)
+
+    def __init__(self, rows: int, cols: int, dump: bytearray) -> None:
+        self.levels = self.layout(rows, cols)
+        self.counts = array("I", bytes(4 * self.size(rows, cols)))
+        self.data = bytearray(len(self.counts))
+        for row in range(rows):
+            solid = dump[row * cols : (row + 1) * cols].translate(_SOLID)
+            for shift, offset, stride in self.levels:
+                size = 1 << shift
+                base = offset + (row >> shift) * stride
+                for block in range(stride):
+                    self.counts[base + block] += solid.count(
+                        1, block * size, (block + 1) * size
+                    )
+        for i, count in enumerate(self.counts):
+            self.data[i] = count > 0
+
+    def _count(self, row: int, col: int, delta: int) -> None:
+        for shift, offset, stride in self.levels:
+            i = offset + (row >> shift) * stride + (col >> shift)
+            self.counts[i] += delta
+            self.data[i] = self.counts[i] > 0
+
+    def add(self, entity: characters.Entity) -> None:
+        self._count(entity.row, entity.col, 1)
+        entity.trackers.append(self)
+
+    def discard(self, entity: characters.Entity) -> None:
+        if self in entity.trackers:
+            entity.trackers.remove(self)
+            self._count(entity.row, entity.col, -1)
+
+    def moved(self, entity: characters.Entity, old_row: int, old_col: int) -> None:
+        self._count(old_row, old_col, -1)
+        self._count(entity.row, entity.col, 1)
 
 
 class Map:
     _REPLACE = {"▄", "▐", "█"}
     WALL_CHAR = {"|"}
     BOUND_CHAR = {"W"}
+    # Drawn as sprites by the 3D view, which has their looks
+    SPRITE_CHAR = {"M", "V", "C", "0", "G", "1", "P"}
     REPR_CHAR = {
         "S": [240, 255, 0],
         "V": [128, 128, 128],
@@ -26,12 +344,30 @@ class Map:
         "0": [128, 128, 128],
         "M": [0, 247, 255],
     }
+    # Contact messages waiting for the terminal view; older ones are dropped
+    MAX_MESSAGES = 16
+    # Horizontal offsets of the scrolling viewport kept cut, see get_viewport
+    VIEW_STRIPS = 32
+    # Hunters this close to their target (by Entity.distance) chase it along
+    # a shortest path instead of making their own move
+    CHASE_RADIUS = 16
 
-    def __init__(self, map_file_name: str) -> None:
+    def __init__(
+        self, map_file_name: str, scroll: bool = False, seed: Optional[int] = None
+    ) -> None:
+        self.map_file_name = map_file_name
+        # The live entities of this map, and only those add_entity() took in
+        self.registry = entity_registry.EntityRegistry()
+        # Every random draw in the simulation comes from one of these streams
+        self.rng = rq_random.RandomStreams(seed)
+        self._wander_streams: Dict[int, rq_random.Stream] = {}
         self.chunk_rows, self.chunk_cols = rq_utils.get_chunk_size()
         self.chunks, self.lines = Map.get_campus_map(
             map_file_name, self.chunk_rows, self.chunk_cols
         )
+        # Scroll a chunk-sized viewport centred on the player instead of
+        # flipping between fixed chunks
+        self.scroll = scroll
         # Read only copy
         self.protomap = Map.get_campus_map_no_chunk(map_file_name)
         m_h, m_w = len(self.protomap), len(self.protomap[0])
@@ -41,70 +377,102 @@ class Map:
         # typedef uint8_t Cols[m_w];
         self.Row = ctypes.c_uint8 * m_w
         # typedef Cols Rows[m_h];
-        self.ByteMap = self.Row * m_w
+        self.ByteMap = self.Row * m_h
+        self.distance_field = DistanceField(m_h, m_w)
+        self.free_cells = FreeCellIndex(self.lines)
+        # Cells nothing can walk onto
+        blocked = self._REPLACE | self.BOUND_CHAR | self.REPR_CHAR.keys()
+        self.paths = pathfinding.PathService(self.lines, blocked)
+        # Cells the 3D view's rays stop at; _REPLACE are walls in protomap
+        opaque = self._REPLACE | self.WALL_CHAR | self.BOUND_CHAR | self.SPRITE_CHAR
+        self.sight = visibility.Visibility(self.lines, opaque)
+        # The view, its HUD and the first row of messages fill the terminal
+        self.terminal = term_io.TerminalView(rows=self.chunk_rows + 2)
+        self.messages: deque = deque(maxlen=Map.MAX_MESSAGES)
+        # Entity type -> (squared contact distance, contact handler)
+        self._contacts: Dict[type, Tuple[int, Callable]] = {}
+        # Display-ordered (reversed) lines of each chunk, built on first view
+        self._chunk_lines: Dict[Tuple[int, int], List[str]] = {}
+        # Display-ordered copy of the whole map for the scrolling viewport
+        self._reversed_lines = [line[::-1] for line in self.lines]
+        self._viewport: Tuple[Tuple[int, int], List[str]] = ((-1, -1), [])
+        # Every row of the map cut to the viewport's width, for each of the
+        # last VIEW_STRIPS horizontal offsets it was at; most recent last
+        self._view_strips: "OrderedDict[int, List[str]]" = OrderedDict()
+        self.chunk_index = ChunkIndex(self.chunk_rows, self.chunk_cols)
 
+        # Walls only, entities are counted as they're added
+        self.occupancy = OccupancyPyramid(m_h, m_w, self.byte_dump())
         start_row = 53
         start_col = 123
         self.player = characters.Player(start_row, start_col)
-        self.entities: List[characters.Entity] = [self.player]
+        self._next_uid = 0
+        self.add_entity(self.player)
         self.populate()
         
         import lib_rq
         self.get_camera_player = lib_rq.Camera.bound_entity
 
+    def add_entity(self, entity: characters.Entity) -> None:
+        entity.uid = self._next_uid
+        self._next_uid += 1
+        entity.rng = self.rng.stream(("entity", entity.uid))
+        self._wander_streams[entity.uid] = self.rng.stream(
+            ("move_all", entity.uid)
+        )
+        self.registry.register(entity)
+        self.chunk_index.add(entity)
+        self.distance_field.add(entity)
+        self.occupancy.add(entity)
+
+    @property
+    def entities(self) -> List[characters.Entity]:
+        """Live entities, in no particular order"""
+        return self.registry.live
+
     def populate(self) -> None:
         """
         Purpose:    Populates the self.entities list with
                     randomly spaced entities.
                     Each entity type should be randomly chosen, and should be
                     randomly placed in a valid position (empty space ' ')
-                    on the map.
+                    on the map. No two entities share a spawn cell.
         Parameters: none
         User Input: no
         Prints:     nothing
         Returns:    nothing
         Modifies:   the self.entities list of Entity objects
-        Calls:      standard python, character __init__ constructors
+        Calls:      standard python, character __init__ constructors,
+                    CellSampler.take()
         """
-        height = len(self.lines)
-        width = len(self.lines[0])
-
-        def get_random_valid_pos() -> Tuple[int, int]:
-            def get_random_pos() -> Tuple[int, int]:
-                return (random.randint(0, height - 1), random.randint(0, width - 1))
-
-            obj_i, obj_j = get_random_pos()
-            while self.lines[obj_i][obj_j] != " ":
-                obj_i, obj_j = get_random_pos()
-            return obj_i, obj_j
+        # Never spawn on top of the player or the hardcoded entities below
+        spawns = self.free_cells.sampler(
+            reserved=[(self.player.row, self.player.col), (26, 150), (114, 155)],
+            rng=self.rng.stream("populate"),
+        )
 
         # AntiCiphers - 200 is good
-        for _ in range(100):
-            obj_i, obj_j = get_random_valid_pos()
-            self.entities.append(characters.AntiCipher(obj_i, obj_j, self.player))
+        for obj_i, obj_j in spawns.take(100):
+            self.add_entity(characters.AntiCipher(obj_i, obj_j, self.player))
         # The1s
-        for _ in range(50):
-            obj_i, obj_j = get_random_valid_pos()
-            self.entities.append(characters.The1(obj_i, obj_j))
+        for obj_i, obj_j in spawns.take(50):
+            self.add_entity(characters.The1(obj_i, obj_j))
 
-        for _ in range(50):
-            obj_i, obj_j = get_random_valid_pos()
-            self.entities.append(characters.AdminSmith(obj_i, obj_j))
+        for obj_i, obj_j in spawns.take(50):
+            self.add_entity(characters.AdminSmith(obj_i, obj_j))
 
         # Hardcode the positions for now
         self.oracle = characters.The0racle(26, 150)
-        self.entities.append(self.oracle)
-        self.entities.append(characters.VaccineDrive(114, 155))
+        self.add_entity(self.oracle)
+        self.add_entity(characters.VaccineDrive(114, 155))
 
         # Ten hoarders also check the toilet paper
-        for _ in range(10):
-            obj_i, obj_j = get_random_valid_pos()
-            self.entities.append(characters.PoliceDrone(obj_i, obj_j, self.oracle))
+        for obj_i, obj_j in spawns.take(10):
+            self.add_entity(characters.PoliceDrone(obj_i, obj_j, self.oracle))
 
         # Masks for your protection
-        for _ in range(15):
-            obj_i, obj_j = get_random_valid_pos()
-            self.entities.append(characters.Mask(obj_i, obj_j))
+        for obj_i, obj_j in spawns.take(15):
+            self.add_entity(characters.Mask(obj_i, obj_j))
 
     @staticmethod
     def get_campus_map(
@@ -192,62 +560,174 @@ class Map:
         else:
             return False
 
-    def move_all(self) -> bool:
+    def move_all(self, draw: bool = True) -> bool:
         """
         Purpose:    Updates every entity in the game,
-                    and then prints out the state.
+                    and then prints out the state (unless draw is False).
                     Also checks each entity to see if it's in range of the
                     player entity, and updates the player's
                     'exposure factor' accordingly
-        Parameters: none
+        Parameters: draw, whether to print the map afterwards, as bool
         User Input: no
-        Prints:     the message from any in-range entities
-                    the current chunk with the player and all other entities
-                    superimposed over it
+        Prints:     the current chunk with the player and all other entities
+                    superimposed over it, and the message from any in-range
+                    entities
         Returns:    False if the player's exposure factor exceeded 1,
                     True otherwise
         Modifies:   the exposure factor of the player entity, if applicable
-        Calls:      standard python, random.choice, entity's move(),
-                    distance(), and contact_dist() functions, process_move(),
+        Calls:      standard python, rq_random.choice_batch, chase_step(),
+                    entity's move(), process_move(), resolve_contacts(),
                     pretty_print()
         """
-        for entity in self.entities:
-            if entity != self.player and self.get_camera_player().entity != entity:
-                if (move := entity.move()):
-                    # Randomize the move to avoid making things too difficult and
-                    # to avoid stuff getting stuck on walls
-                    # This is a bit messy, but it becomes much harder to test the
-                    # student-written move functions
-                    # if there's nontrivial randomization
-                    random_move = random.choice(
-                        [
-                            KEY_DICT["up"],
-                            KEY_DICT["left"],
-                            KEY_DICT["down"],
-                            KEY_DICT["right"],
-                        ]
-                    )
-                    
-                    if not self.process_move(entity, move):
-                        move = random_move
-                    else:
-                        self.process_move(entity, move)
-        # Check proximity
-        for entity in self.entities:
-            if entity != self.player and entity.active:
-                if self.player.distance(entity) < entity.contact_dist():
-                    entity.contact_player(self.player)
-                    logger.warn(f"contact")
-                    print("\033c" + str(entity))
-
-        # Remove any deactivated entities
-        self.entities = [entity for entity in self.entities if entity.active]
+        if (rec := replay.recorder()) is not None:
+            rec.tick()
+        camera_entity = self.get_camera_player().entity
+        movers = [
+            entity
+            for entity in self.entities
+            if entity != self.player and camera_entity != entity
+        ]
+        # Draw every entity's random move in one batch; Entity.move() hands
+        # it out when it has nothing better to do. Each entity has its own
+        # stream for these, so the batch gives the same moves as drawing
+        # them one at a time
+        random_moves = rq_random.choice_batch(
+            [self._wander_streams[entity.uid] for entity in movers],
+            [KEY_DICT["up"], KEY_DICT["left"], KEY_DICT["down"], KEY_DICT["right"]],
+        )
+        for entity, random_move in zip(movers, random_moves):
+            chase = self.chase_step(entity)
+            if chase is not None:
+                # As many steps as a move of its own that isn't blocked,
+                # each one along the path
+                if self.process_move(entity, chase):
+                    chase = self.chase_step(entity)
+                    if chase is not None:
+                        self.process_move(entity, chase)
+                continue
+            entity.next_wander = random_move
+            move = entity.move()
+            # Not used up (e.g. a queued move came first), so it's not kept
+            entity.next_wander = None
+            # A move that isn't blocked is made twice
+            if move and self.process_move(entity, move):
+                self.process_move(entity, move)
+        self.resolve_contacts()
+
+        # The registry dropped deactivated entities as they happened, the
+        # spatial indexes let go of them here
+        for entity in self.registry.take_removed():
+            self.chunk_index.discard(entity)
+            self.distance_field.discard(entity)
+            self.occupancy.discard(entity)
         if self.player.check_for_game_ended():
             return False
 
-        self.pretty_print()
+        if draw:
+            self.pretty_print()
         return True
 
+    @staticmethod
+    def chase_target(entity: characters.Entity) -> Optional[characters.Entity]:
+        """
+        Purpose:    Finds who a hunter goes after
+        Parameters: entity, the possible hunter
+        User Input: no
+        Prints:     nothing
+        Returns:    the AntiCipher's player or the PoliceDrone's Oracle as
+                    Entity, None for anything else
+        Modifies:   nothing
+        Calls:      standard python
+        """
+        if isinstance(entity, characters.AntiCipher):
+            return entity.player_to_hunt
+        if isinstance(entity, characters.PoliceDrone):
+            return entity.vaccine
+        return None
+
+    def chase_step(self, entity: characters.Entity) -> Optional[str]:
+        """
+        Purpose:    Finds the move that takes a hunter one step closer to
+                    its target around any walls in the way
+        Parameters: entity, the hunter
+        User Input: no
+        Prints:     nothing
+        Returns:    the move (KEY_DICT['direction']) as str, or None if
+                    entity doesn't hunt anything, its target is more than
+                    CHASE_RADIUS away or it can't get closer
+        Modifies:   nothing (the path service may cache a flow field)
+        Calls:      standard python, chase_target(), Entity.distance(),
+                    PathService.step()
+        """
+        target = self.chase_target(entity)
+        if target is None or not target.active:
+            return None
+        if entity.distance(target) > self.CHASE_RADIUS:
+            return None
+        return self.paths.step(entity.row, entity.col, (target.row, target.col))
+
+    def can_see(self, entity: characters.Entity, other: characters.Entity) -> bool:
+        """
+        Purpose:    Checks for a line of sight between two entities
+        Parameters: entity and other, the two entities
+        User Input: no
+        Prints:     nothing
+        Returns:    True if no wall is in the way, as bool
+        Modifies:   nothing (the answer is cached)
+        Calls:      standard python, Visibility.can_see()
+        """
+        return self.sight.can_see((entity.row, entity.col), (other.row, other.col))
+
+    def visible_entities(
+        self, row: int, col: int, entities: List[characters.Entity]
+    ) -> List[characters.Entity]:
+        """
+        Purpose:    Picks out the entities that can be seen from a cell
+        Parameters: row and col of the cell as int, entities to check
+        User Input: no
+        Prints:     nothing
+        Returns:    the visible entities, in the order given, as list
+        Modifies:   nothing (the answers are cached)
+        Calls:      standard python, Visibility.visible()
+        """
+        cells = [(entity.row, entity.col) for entity in entities]
+        flags = self.sight.visible((row, col), cells)
+        return [entity for entity, visible in zip(entities, flags) if visible]
+
+    def resolve_contacts(self) -> None:
+        """
+        Purpose:    Finds every active entity within contact distance of the
+                    player and lets it make contact. Messages are queued
+                    for the next frame of the terminal view, not printed.
+        Parameters: none
+        User Input: no
+        Prints:     nothing
+        Returns:    none
+        Modifies:   the player and contacted entities (via contact_player),
+                    self.messages
+        Calls:      standard python, entity's contact_dist(),
+                    contact_player() and __str__() functions
+        """
+        player = self.player
+        row, col = player.row, player.col
+        others = [e for e in self.entities if e is not player and e.active]
+        # int(sqrt(d2)) < r is d2 < r * r, so no square roots are needed
+        dist2 = [(e.row - row) ** 2 + (e.col - col) ** 2 for e in others]
+        for entity, d2 in zip(others, dist2):
+            rule = self._contacts.get(type(entity))
+            if rule is None:
+                # contact_dist() is fixed per type, so ask once
+                rule = (entity.contact_dist() ** 2, type(entity).contact_player)
+                self._contacts[type(entity)] = rule
+            radius2, contact = rule
+            if d2 < radius2 and entity.active:
+                out = io.StringIO()
+                with contextlib.redirect_stdout(out):
+                    contact(entity, player)
+                    message = str(entity)
+                logger.warning("contact with %s", type(entity).__name__)
+                self.messages.append(message + "\n" + out.getvalue())
+
     def get_chunk(self, row: int, col: int) -> List[str]:
         """
         Purpose:    Get the chunk that corresponds to a position
@@ -288,15 +768,76 @@ class Map:
         Prints:     nothing
         Returns:    the list of entities in the same chunk as the position
         Modifies:   nothing
-        Calls:      standard python
+        Calls:      standard python, ChunkIndex.get()
         """
-        chunk_i = row // self.chunk_rows
-        chunk_j = col // self.chunk_cols
-        same_chunk: Callable[[characters.Entity], bool] = lambda entity: (
-            (entity.row // self.chunk_rows) == chunk_i
-        ) and ((entity.col // self.chunk_cols) == chunk_j)
-        entities = [entity for entity in self.entities if same_chunk(entity)]
-        return entities
+        return list(self.chunk_index.get(*self.chunk_index.key(row, col)))
+
+    def get_chunk_lines(self, row: int, col: int) -> List[str]:
+        """
+        Purpose:    Get the display-ordered lines of the chunk that
+                    corresponds to a position in the overall map
+        Parameters: the row and col of the position within the overall map,
+                    as ints
+        User Input: no
+        Prints:     nothing
+        Returns:    the chunk's lines, each reversed for display, as list of
+                    str. The same list is returned every time.
+        Modifies:   the chunk line cache
+        Calls:      standard python, get_chunk()
+        """
+        key = (row // self.chunk_rows, col // self.chunk_cols)
+        if key not in self._chunk_lines:
+            self._chunk_lines[key] = [line[::-1] for line in self.get_chunk(row, col)]
+        return self._chunk_lines[key]
+
+    def get_viewport(
+        self, row: int, col: int
+    ) -> Tuple[List[str], Dict[Tuple[int, int], str]]:
+        """
+        Purpose:    Get a chunk-sized view of the map centred on a position,
+                    with the entities inside it
+        Parameters: the row and col to centre the view on, as ints
+        User Input: no
+        Prints:     nothing
+        Returns:    (lines, cells), the display-ordered lines of the view as
+                    list of str and the entity characters keyed on their
+                    (row, col) within the view
+        Modifies:   the cached viewport and row strips
+        Calls:      standard python, ChunkIndex.get(), entity's char() function
+        """
+        rows = min(self.chunk_rows, self.height)
+        cols = min(self.chunk_cols, self.width)
+        top = min(max(row - rows // 2, 0), self.height - rows)
+        left = min(max(col - cols // 2, 0), self.width - cols)
+        if self._viewport[0] != (top, left):
+            # Map columns [left, left + cols) are this slice of the reversed
+            # lines. Rows are cut once per offset, so scrolling up and down
+            # or back to where the view was only picks out rows already cut
+            start = self.width - left - cols
+            strip = self._view_strips.get(start)
+            if strip is None:
+                strip = [line[start : start + cols] for line in self._reversed_lines]
+                self._view_strips[start] = strip
+                if len(self._view_strips) > self.VIEW_STRIPS:
+                    self._view_strips.popitem(last=False)
+            else:
+                self._view_strips.move_to_end(start)
+            self._viewport = ((top, left), strip[top : top + rows])
+        lines = self._viewport[1]
+
+        player_char = self.player.char()
+        cells: Dict[Tuple[int, int], str] = {}
+        first_i, first_j = self.chunk_index.key(top, left)
+        last_i, last_j = self.chunk_index.key(top + rows - 1, left + cols - 1)
+        for chunk_i in range(first_i, last_i + 1):
+            for chunk_j in range(first_j, last_j + 1):
+                for entity in self.chunk_index.get(chunk_i, chunk_j):
+                    i, j = entity.row - top, entity.col - left
+                    if 0 <= i < rows and 0 <= j < cols:
+                        pos = (i, cols - 1 - j)
+                        if cells.get(pos) != player_char:
+                            cells[pos] = entity.char()
+        return lines, cells
 
     def pretty_print(self) -> None:
         """
@@ -305,34 +846,27 @@ class Map:
         Parameters: none
         User Input: no
         Prints:     the current chunk with the player and all other entities
-                    superimposed over it
+                    superimposed over it, as a diff against the last frame
         Returns:    none
-        Modifies:   nothing
-        Calls:      standard python, get_chunk(), get_chunk_idxs(),
-                    get_entities_in_same_chunk(), entity's char() function
+        Modifies:   the terminal view's frame state
+        Calls:      standard python, get_chunk_lines(), get_chunk_idxs(),
+                    get_entities_in_same_chunk(), get_viewport(),
+                    entity's char() function, TerminalView.present()
         """
-        print("\033c")
         player = self.get_camera_player()
-        chunk = self.get_chunk(player.row, player.col)
-        # row_modifiers: Dict[int, List[Tuple[int, str]]] = {}
-        row_modifiers: Dict[int, Dict[int, str]] = defaultdict(dict)
-        
-        for entity in self.get_entities_in_same_chunk(player.row, player.col):
-            # For each entity in the current chunk, place it in a dict keyed on
-            # the row and store the column and character
-            i, j = self.get_chunk_idxs(entity.row, entity.col)
-            if (j not in row_modifiers[i]) or (
-                row_modifiers[i][j] != self.player.char()
-            ):
-                row_modifiers[i][j] = entity.char()
-        for idx, line in enumerate(chunk):
-            line_list = list(line)
-            if idx in row_modifiers:
-                # For each entity in the row,
-                # replace with the corresponding char
-                for col in row_modifiers[idx]:
-                    line_list[col] = row_modifiers[idx][col]
-            print("".join(reversed(line_list)))
+        if self.scroll:
+            lines, cells = self.get_viewport(player.row, player.col)
+        else:
+            lines = self.get_chunk_lines(player.row, player.col)
+            player_char = self.player.char()
+            cells = {}
+            for entity in self.get_entities_in_same_chunk(player.row, player.col):
+                # For each entity in the current chunk, place it at its display
+                # position. Lines are reversed, so the column is mirrored.
+                i, j = self.get_chunk_idxs(entity.row, entity.col)
+                pos = (i, len(lines[i]) - 1 - j)
+                if cells.get(pos) != player_char:
+                    cells[pos] = entity.char()
         exposure_str = "Your exposure factor is {:.2f}".format(
             self.player.exposure_factor
         )
@@ -340,7 +874,11 @@ class Map:
             self.oracle.get_direction(self.player)
         )
         padding = " " * (self.chunk_cols - len(exposure_str) - len(oracle_str))
-        print(exposure_str + padding + oracle_str)
+        messages = list(self.messages)
+        self.messages.clear()
+        self.terminal.present(
+            lines, cells, exposure_str + padding + oracle_str, messages
+        )
 
     def byte_dump(self) -> bytearray:
         # cast to mutable bytearrays
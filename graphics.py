@@ -1,15 +1,25 @@
+import asyncio
 import enum
 import logging
-from multiprocessing import Condition, Value
+import multiprocessing
+from multiprocessing import Barrier, Condition, Value
 from multiprocessing.shared_memory import SharedMemory
-import collections
+import concurrent.futures
+import copy
 import os
 import signal
+import struct
+import threading
 import abc
-import contextlib
-from typing import Callable
+import ctypes
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+import rq_utils
 
 logger = logging.getLogger(__name__)
+# A broken kernel fails the same way on every core, every frame
+logger.addFilter(rq_utils.RateLimit())
 
 BYTES_PER_PIX = 3
 
@@ -35,118 +45,561 @@ class Res(enum.Enum):
     def size(self):
         return self.value[0] * self.value[1] * BYTES_PER_PIX
 
-class GPU(collections.UserList):
+class FrameHeader(ctypes.Structure):
+    """Written to the start of vram every frame, ahead of the kernel input"""
+
+    _fields_ = [
+        ("width", ctypes.c_uint16),
+        ("height", ctypes.c_uint16),
+        # Counts up from 1, so workers can tell whether they drew the frame
+        # before this one
+        ("frame", ctypes.c_uint32),
+    ]
+
+
+FRAME_HEADER_SIZE = ctypes.sizeof(FrameHeader)
+
+
+def scaled_sizes(
+    res: Res, min_width: int = Res.R128x72.width
+) -> List[Tuple[int, int]]:
+    """
+    res divided by every whole factor that divides both sides, largest first.
+    Each one zooms up to exactly fill a view sized for res.
+    """
+    return [
+        (res.width // k, res.height // k)
+        for k in range(1, res.width // min_width + 1)
+        if res.width % k == 0 and res.height % k == 0
+    ]
+
+
+class ResolutionController:
+    """
+    Moves the render resolution between sizes to hold a target frame time.
+
+    Render times are smoothed with an exponential moving average. The
+    resolution drops as soon as the average goes over target, but only climbs
+    back once the next size up is predicted to fit with headroom to spare and
+    the current one has been held for a while, so it doesn't flip back and
+    forth around the target.
+
+    Past the smallest size it can go lod_steps further, each one asking the
+    caller to give up some other detail (see lod) at the same resolution.
+    """
+
+    def __init__(
+        self,
+        sizes: List[Tuple[int, int]],
+        target: float,
+        *,
+        alpha: float = 0.1,
+        headroom: float = 0.8,
+        hold: int = 30,
+        lod_steps: int = 0,
+    ):
+        self.sizes = sizes
+        self.lod_steps = lod_steps
+        self.target = target
+        self._alpha = alpha
+        self._headroom = headroom
+        self._hold = hold
+        self._level = 0
+        self._frames = 0
+        self._average: Optional[float] = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.sizes[min(self._level, len(self.sizes) - 1)]
+
+    @property
+    def lod(self) -> int:
+        """How many steps of detail to give up, 0 to lod_steps"""
+        return max(0, self._level - len(self.sizes) + 1)
+
+    def _area(self, level: int) -> int:
+        width, height = self.sizes[min(level, len(self.sizes) - 1)]
+        return width * height
+
+    def _switch(self, level: int):
+        # Assume cost scales with pixel count so the average stays meaningful
+        if self._average is not None:
+            self._average *= self._area(level) / self._area(self._level)
+        self._level = level
+        self._frames = 0
+        logger.debug("render resolution %dx%d lod %d", *self.size, self.lod)
+
+    def __call__(self, render_time: float) -> Tuple[int, int]:
+        """Record the last frame's render time, returns the size for the next"""
+        if self._average is None:
+            self._average = render_time
+        else:
+            self._average += self._alpha * (render_time - self._average)
+        self._frames += 1
+
+        if self._average > self.target:
+            if self._level < len(self.sizes) - 1 + self.lod_steps:
+                self._switch(self._level + 1)
+        elif self._level > 0 and self._frames >= self._hold:
+            predicted = (
+                self._average * self._area(self._level - 1) / self._area(self._level)
+            )
+            if predicted < self.target * self._headroom:
+                self._switch(self._level - 1)
+        return self.size
+
+
+# Seconds workers get to come up, or to finish their frame when stopped
+WORKER_TIMEOUT = 10.0
+
+
+class Executor(abc.ABC):
+    """Runs the GPU's kernel on every core, one frame at a time"""
+
+    def __init__(self, gpu: "GPU"):
+        self.gpu = gpu
+
+    @abc.abstractmethod
+    def start(self, raster: SharedMemory, vram: SharedMemory):
+        """Bring up the workers, returns once they can take a frame"""
+
+    @abc.abstractmethod
+    def run(self, timeout: Optional[float]):
+        """Render the frame described by vram, blocks until done or timeout"""
+
+    async def submit(self, timeout: Optional[float]):
+        """run, awaited so the event loop carries on while the cores render"""
+        await asyncio.get_running_loop().run_in_executor(None, self.run, timeout)
+
+    @abc.abstractmethod
+    def stop(self):
+        pass
+
+
+class ForkExecutor(Executor):
+    """
+    One forked child per core, woken by a shared condition. The last core
+    done with a frame also writes its number to a pipe, which the event
+    loop can watch.
+    """
+
+    # Frame numbers as written to the pipe
+    DONE = struct.Struct("L")
+
+    def start(self, raster, vram):
+        gpu = self.gpu
+        self._cond = Condition()
+        # Bumped once per frame, so a core that wasn't waiting yet when
+        # notified still sees there is a frame to render
+        self._frame = Value('L', 0, lock=self._cond)
+        self._stopping = Value('b', False, lock=self._cond)
+        self._value_cond = Condition()
+        self._value = Value('i', 0, lock=self._value_cond)
+        self._children = []
+        self._done_r, self._done_w = os.pipe()
+        os.set_blocking(self._done_r, False)
+        # The parent and every core meet here once the cores are attached
+        ready = Barrier(gpu.cores + 1)
+        for id in range(gpu.cores):
+            if (child := os.fork()) == 0:
+                # Never unwind into the parent's stack from a child
+                try:
+                    self._core(id, raster.name, vram.name, ready)
+                finally:
+                    os._exit(0)
+            self._children.append(child)
+        try:
+            ready.wait(timeout=WORKER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            self.stop()
+            raise RuntimeError("render cores did not start") from None
+
+    def _core(self, idx: int, raster_name: str, vram_name: str, ready):
+        # Ctrl-C is for the parent, which stops the cores through stop()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        raster, vram = SharedMemory(raster_name), SharedMemory(vram_name)
+        ready.wait()
+        frame = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._frame.value != frame)
+                frame = self._frame.value
+                if self._stopping.value:
+                    return
+            try:
+                self.gpu.launch(idx, vram.buf, raster.buf)
+            except Exception:
+                logger.exception("render core %d failed", idx)
+
+            with self._value:
+                self._value.value += 1
+                if self._value.value == self.gpu.cores:
+                    self._value_cond.notify_all()
+                    os.write(self._done_w, self.DONE.pack(frame))
+
+    def _done(self) -> List[int]:
+        """Frames finished since last asked"""
+        data = b""
+        try:
+            while chunk := os.read(self._done_r, 4096):
+                data += chunk
+        except BlockingIOError:
+            pass
+        return [frame for frame, in self.DONE.iter_unpack(data)]
+
+    def _dispatch(self) -> int:
+        """Wake the cores for a new frame, returns its number"""
+        self._value.value = 0
+        with self._cond:
+            self._frame.value += 1
+            self._cond.notify_all()
+            return self._frame.value
+
+    def run(self, timeout):
+        # Only submit() waits on the pipe, keep it from filling up
+        self._done()
+        self._dispatch()
+        with self._value_cond:
+            # The last core may have finished before we got here
+            self._value_cond.wait_for(
+                lambda: self._value.value == self.gpu.cores, timeout=timeout
+            )
+
+    async def submit(self, timeout):
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+        # A frame that timed out earlier can still finish while this one is
+        # rendering, so look for this frame's number
+        self._done()
+        frame = self._dispatch()
+
+        def on_done():
+            if frame in self._done() and not finished.done():
+                finished.set_result(None)
+
+        loop.add_reader(self._done_r, on_done)
+        try:
+            await asyncio.wait([finished], timeout=timeout)
+        finally:
+            loop.remove_reader(self._done_r)
+
+    def stop(self):
+        with self._cond:
+            self._stopping.value = True
+            self._frame.value += 1
+            self._cond.notify_all()
+        # Cores finish the frame they're on first. One that doesn't in time
+        # is killed
+        deadline = time.monotonic() + WORKER_TIMEOUT
+        for child in self._children:
+            while os.waitpid(child, os.WNOHANG) == (0, 0):
+                if time.monotonic() > deadline:
+                    os.kill(child, signal.SIGKILL)
+                    os.waitpid(child, 0)
+                    break
+                time.sleep(0.01)
+        self._children.clear()
+        os.close(self._done_r)
+        os.close(self._done_w)
+
+
+# Per process state of a spawned worker: the GPU and its attached buffers
+_worker: Optional[Tuple["GPU", SharedMemory, SharedMemory]] = None
+
+
+def _spawn_init(gpu: "GPU", raster_name: str, vram_name: str, ready):
+    global _worker
+    _worker = gpu, SharedMemory(raster_name), SharedMemory(vram_name)
+    ready.wait()
+
+
+def _spawn_launch(idx: int):
+    if _worker is None:
+        raise RuntimeError("render worker was not initialised")
+    gpu, raster, vram = _worker
+    gpu.launch(idx, vram.buf, raster.buf)
+
+
+class PoolExecutor(Executor):
+    """
+    Runs each frame as one task per core on a concurrent.futures pool. Like
+    fork cores, the pool skips to the latest frame: tasks of a frame that
+    timed out are cancelled if they haven't started, so they can't pile up.
+    """
+
+    _pool: concurrent.futures.Executor
+
+    # Renders core idx's share of the frame in vram
+    _launch: Callable[[int], None]
+
+    def __init__(self, gpu: "GPU"):
+        super().__init__(gpu)
+        self._pending: List[concurrent.futures.Future] = []
+
+    def _dispatch(self) -> List[concurrent.futures.Future]:
+        for future in self._pending:
+            future.cancel()
+        self._pending = [
+            self._pool.submit(self._launch, i) for i in range(self.gpu.cores)
+        ]
+        return self._pending
+
+    @staticmethod
+    def _report(
+        futures: Sequence[Union[concurrent.futures.Future, asyncio.Future]]
+    ):
+        """Log the cores that failed rather than leave a blank frame unexplained"""
+        for idx, future in enumerate(futures):
+            if future.done() and not future.cancelled():
+                error = future.exception()
+                if error is not None:
+                    logger.error("render core %d failed", idx, exc_info=error)
+
+    def run(self, timeout):
+        futures = self._dispatch()
+        concurrent.futures.wait(futures, timeout=timeout)
+        self._report(futures)
+
+    async def submit(self, timeout):
+        futures = [asyncio.wrap_future(future) for future in self._dispatch()]
+        await asyncio.wait(futures, timeout=timeout)
+        self._report(futures)
+
+    def stop(self):
+        self._pool.shutdown(cancel_futures=True)
+        self._pending = []
+
+
+class SpawnExecutor(PoolExecutor):
+    """
+    A pool of freshly spawned interpreters. Nothing of the parent (Tk
+    included) is inherited, so the GPU and its arg_factory must pickle.
+    """
+
+    def start(self, raster, vram):
+        gpu = self.gpu
+        context = multiprocessing.get_context("spawn")
+        ready = context.Barrier(gpu.cores + 1)
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=gpu.cores,
+            mp_context=context,
+            initializer=_spawn_init,
+            initargs=(gpu, raster.name, vram.name, ready),
+        )
+        # The pool spawns a worker per submit while none is idle, and none
+        # will be until they have all met at the barrier
+        for _ in range(gpu.cores):
+            self._pool.submit(int)
+        try:
+            ready.wait(timeout=WORKER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            self.stop()
+            raise RuntimeError("render workers did not start") from None
+
+    # A plain function, so it's pickled by name rather than with the pool
+    _launch = staticmethod(_spawn_launch)
+
+
+class ThreadExecutor(PoolExecutor):
+    """
+    A thread per core in this process. Only faster than one core when the
+    kernel releases the GIL or the interpreter is free-threaded.
+    """
+
+    def start(self, raster, vram):
+        self._raster, self._vram = raster, vram
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.gpu.cores, thread_name_prefix="gpu"
+        )
+
+    def _launch(self, idx: int):
+        # Errors end up on the future, which run() and submit() report
+        self.gpu.launch(idx, self._vram.buf, self._raster.buf)
+
+
+EXECUTORS: Dict[str, Type[Executor]] = {
+    "fork": ForkExecutor,
+    "spawn": SpawnExecutor,
+    "thread": ThreadExecutor,
+}
+
+
+def parse_cores(spec: Union[int, str]) -> Tuple[str, int]:
+    """
+    "8" or 8 -> ("fork", 8), "thread:4" -> ("thread", 4). A backend name on
+    its own gets one worker per CPU.
+    """
+    backend, _, count = str(spec).rpartition(":")
+    if not backend and not count.isdigit():
+        backend, count = count, ""
+    backend = backend or "fork"
+    if backend not in EXECUTORS:
+        raise ValueError(f"unknown render backend {backend!r}")
+    return backend, int(count) if count else os.cpu_count() or 1
+
+
+class GPU:
     """If only OpenCL/CUDA was part of python..."""
     
     cores: int
+    # Size of the frame being rendered, at most the resolution the GPU was
+    # created with
     width: int
     height: int
-    block_X: int
-    
+    frame: int
+    render_time: float
+    # Longest a frame is waited on before presenting whatever made it into
+    # the raster. None waits for every core
+    timeout: Optional[float] = 0.1
+    # BYTES_PER_PIX for RGB, 1 for an index into a palette
+    bytes_per_pix: int
 
     def __init__(self, 
         resolution: Res,
         core_count: int,
         vram_size: int,
         arg_factory: Callable[[bytearray], None],
-        renderscale: int,
+        backend: str = "fork",
+        bytes_per_pix: int = BYTES_PER_PIX,
     ):
-        super().__init__()
         self.arg_factory = arg_factory
-        self._id = os.getpid()
-        self._cond = Condition()
-        self._value_cond = Condition()
-        self._value = Value('i', 0, lock=self._value_cond)
+        self.bytes_per_pix = bytes_per_pix
         self._resolution = resolution
         self.cores = self._core_count = core_count
         self._vram_size = vram_size
         self.width = resolution.width
         self.height = resolution.height
-        self.block_X = self.width // self.cores
-        self.render_width = resolution.width * renderscale
-        self.render_height = resolution.height * renderscale
-        self.renderscale = renderscale
+        self.frame = 0
+        self.render_time = 0.0
+        self.backend = backend
+        self._executor = EXECUTORS[backend](self)
+
+    def __getstate__(self):
+        # Only what the kernel needs goes to spawned workers
+        state = self.__dict__.copy()
+        for key in ("_executor", "_raster_buff", "_vram"):
+            state.pop(key, None)
+        return state
+
+    def configure(
+        self,
+        resolution: Res,
+        vram_size: int,
+        arg_factory: Callable[[bytearray], None],
+    ):
+        """
+        Set a running GPU up for a new session. The workers are kept if they
+        can serve it as they are, and restarted if not.
+        """
+        if (
+            resolution.size > self._resolution.size
+            or vram_size > self._vram_size
+            or arg_factory != self.arg_factory
+        ):
+            logger.debug("restarting render workers")
+            self.__exit__()
+            self._resolution = resolution
+            self._vram_size = vram_size
+            self.arg_factory = arg_factory
+            self._executor = EXECUTORS[self.backend](self)
+            self.__enter__()
+        self.resize(resolution.width, resolution.height)
+
+    def resize(self, width: int, height: int):
+        """Render the following frames at width x height"""
+        if width * height > self._resolution.width * self._resolution.height:
+            raise ValueError(f"{width}x{height} does not fit in {self._resolution}")
+        self.width, self.height = width, height
+
+    def columns(self, idx: int) -> Tuple[int, int]:
+        """Columns [start, end) core idx renders, the last takes the remainder"""
+        block = self.width // self.cores
+        end = self.width if idx == self.cores - 1 else block * (idx + 1)
+        return block * idx, end
+
+    def launch(self, idx: int, vram, raster):
+        """
+        Run core idx's share of the frame described by vram's header. The
+        frame's size and number go on a copy of the GPU, as thread cores
+        share this one with the host.
+        """
+        header = FrameHeader.from_buffer_copy(vram)
+        gpu = copy.copy(self)
+        gpu.width, gpu.height = header.width, header.height
+        gpu.frame = header.frame
+        gpu.device(idx, vram[FRAME_HEADER_SIZE:], raster)
+
+    def _load(self, b_in: bytearray):
+        """Set up the next frame in vram"""
+        self.frame += 1
+        header = FrameHeader(self.width, self.height, self.frame)
+        self._vram.buf[:FRAME_HEADER_SIZE] = bytes(header)
+        self._vram.buf[FRAME_HEADER_SIZE : FRAME_HEADER_SIZE + len(b_in)] = b_in
+
+    def _store(self, b_out: bytearray):
+        """Copy out the frame in the raster"""
+        size = self.width * self.height * self.bytes_per_pix
+        b_out[:size] = self._raster_buff.buf[:size]
 
-        
     def __call__(self, b_in: bytearray, b_out: bytearray):
-        # copy in bytes
-        self._value.value = 0
-        self._vram.buf[:len(b_in)] = b_in
-        
-        # wake up
-        with self._cond:
-            self._cond.notify_all()
-        
-        with self._value_cond:
-            self._value_cond.wait(timeout=0.1)
-            b_out[:self._raster_buff.size] = self._raster_buff.buf
+        start = time.perf_counter()
+        self._load(b_in)
+        self._executor.run(self.timeout)
+        self._store(b_out)
+        self.render_time = time.perf_counter() - start
+
+    async def submit(self, b_in: bytearray, b_out: bytearray):
+        """
+        Render a frame like __call__, but as a coroutine. Other tasks on the
+        event loop run until the cores are done with it.
+        """
+        start = time.perf_counter()
+        self._load(b_in)
+        await self._executor.submit(self.timeout)
+        self._store(b_out)
+        self.render_time = time.perf_counter() - start
 
     @abc.abstractmethod
     def device(self, idx, vram, raster):
         pass
 
     def __enter__(self):
+        # Rendered at native resolution, the view scales it up when presenting.
+        # Sized for the largest frame so resizing never touches the workers
         self._raster_buff = SharedMemory(
             create=True,
-            size=self.render_height * self.render_width * BYTES_PER_PIX
-        )
-        self._vram = SharedMemory(
-            create=True,
-            size=self._vram_size,
+            size=(
+                self._resolution.width
+                * self._resolution.height
+                * self.bytes_per_pix
+            ),
         )
-        counter = Value('i', 0)
-        for id in range(self._core_count):
-            if (child := os.fork()) == 0:
-                
-                @contextlib.contextmanager
-                def sharedmem():            
-                    shm = SharedMemory(self._raster_buff.name)
-                    vram = SharedMemory(self._vram.name)
-                    try:
-                        yield shm, vram
-                    finally:
-                        shm.close()
-                        vram.close()
-
-                with sharedmem() as (shm, vram):
-                    with counter:
-                        counter.value += 1
-                    while True:
-                        try:
-                            with self._cond:
-                                self._cond.wait()
-                        except KeyboardInterrupt:
-                            exit(0)
-                        try:
-                            self.device(id, vram.buf, shm.buf)
-                        except:
-                            pass
-
-                        with self._value:
-                            self._value.value += 1
-                            if self._value.value == self._core_count:
-                                self._value_cond.notify_all()
-            else:
-                self.append(child)
-
-        while counter.value < self._core_count:
-            # block until all cores init
-            pass
-        
+        try:
+            self._vram = SharedMemory(
+                create=True,
+                size=FRAME_HEADER_SIZE + self._vram_size,
+            )
+        except BaseException:
+            self._raster_buff.close()
+            self._raster_buff.unlink()
+            raise
+        try:
+            self._executor.start(self._raster_buff, self._vram)
+        except BaseException:
+            for shm in (self._raster_buff, self._vram):
+                shm.close()
+                shm.unlink()
+            raise
         logger.debug(
-            f"@{self._resolution} core count: {self._core_count} "
+            f"@{self._resolution} {self.backend} core count: {self._core_count} "
             f"vram: {self._vram_size} bytes"
         )
         return self
 
 
     def __exit__(self, *args, **kwargs):
-        if os.getpid() == self._id:
-            for child in self:
-                os.kill(child, signal.SIGINT)
-                os.waitpid(child, 0)
-            self._raster_buff.close()
-            self._raster_buff.unlink()
-            self._vram.close()
-            self._vram.unlink()
-
+        self._executor.stop()
+        self._raster_buff.close()
+        self._raster_buff.unlink()
+        self._vram.close()
+        self._vram.unlink()
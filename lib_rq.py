@@ -1,5 +1,5 @@
 import collections
-from typing import Callable, DefaultDict, TYPE_CHECKING, Tuple, Union
+from typing import Callable, DefaultDict, List, TYPE_CHECKING, Tuple, Union
 import textwrap
 import asyncio
 import ctypes
@@ -7,13 +7,13 @@ from ctypes import c_uint8, c_uint16, c_float
 from rq_ui import user_options
 import math
 import logging
+import replay
 
 logger = logging.getLogger(__name__)
 
 if TYPE_CHECKING:
     from game_io import EventPlayer
     from tk_io import PlayerView
-    from tkinter import Event
 
 
 class ReloadEvent(Exception):
@@ -33,6 +33,8 @@ class Camera(ctypes.Structure):
     """
     FOV = 90
     DIST = 10
+    # How far rays go, in cells
+    DRAW_DIST = 100
     POSITION = [0.0, 0.0, 0.0]
     FACING = [0.0, 0.0, 0.0]
     THROTTLE = [0, 0, 0]
@@ -44,6 +46,7 @@ class Camera(ctypes.Structure):
     fov: float
     dist: int
     repr_char: int
+    draw_dist: int
 
     @classmethod
     def is_bound(cls) -> bool:
@@ -56,6 +59,7 @@ class Camera(ctypes.Structure):
         ("fov", c_float),
         ("dist", c_uint16),
         ("repr_char", c_uint8),
+        ("draw_dist", c_uint8),
     ]
 
     _bound_entity: "EventPlayer" = None
@@ -73,6 +77,7 @@ class Camera(ctypes.Structure):
                 self.FOV,
                 self.DIST,
                 ord(' '),
+                self.DRAW_DIST,
             )
         else:
             super().__init__(
@@ -81,6 +86,7 @@ class Camera(ctypes.Structure):
                 self.FOV,
                 self.DIST,
                 ord(self._bound_entity.repr_char),
+                self.DRAW_DIST,
             )
 
     @classmethod
@@ -91,6 +97,8 @@ class Camera(ctypes.Structure):
         # camera through the event player
         if cls._bound_entity is not None:
             cls._bound_entity.camer_bound = False
+        if (rec := replay.recorder()) is not None:
+            rec.bind(evp)
 
         cls.POSITION = evp.position
         cls.FACING = evp.facing_direction
@@ -101,7 +109,9 @@ class Camera(ctypes.Structure):
             evp.move(lambda: evp == cls._bound_entity)
         )
         evp.camera_bound = True
-        logger.info(f"Camera bound to {type(evp.entity).__name__} @ {evp.col, evp.row}")
+        logger.info(
+            "Camera bound to %s @ %s", type(evp.entity).__name__, (evp.col, evp.row)
+        )
 
     @classmethod
     def unbind(cls):
@@ -117,15 +127,19 @@ class Camera(ctypes.Structure):
 
     @classmethod
     def set_throttle(cls, index, value):
+        if (rec := replay.recorder()) is not None:
+            rec.throttle(index, value)
         if cls._bound_entity is not None:
             cls._bound_entity.set_throttle(index, value)
         else:
             cls.THROTTLE[index] = value
     
     @classmethod
-    def set_button(cls, *args, **kwargs):
+    def set_button(cls, button, state):
+        if (rec := replay.recorder()) is not None:
+            rec.button(button, state)
         if cls._bound_entity is not None:
-            cls._bound_entity.set_button(*args, **kwargs)
+            cls._bound_entity.set_button(button, state)
 
     @classmethod
     def on_next(cls, *args, **kwargs):
@@ -142,21 +156,32 @@ class Camera(ctypes.Structure):
             pass
     
     @classmethod
-    def mouse_motion(cls, vp: "PlayerView", event: "Event"):
-        center_x = vp.winfo_width() / 2
-        center_y = vp.winfo_height() / 2
-        dx = (event.x - center_x) * opts.x_sens
-        cls.FACING[0] += math.radians(dx)
-        dy = cls.FACING[1] + math.radians(
-            (event.y - center_y) * opts.y_sens
-        )
+    def look(cls, dx: float, dy: float):
+        """Turn the camera by dx, dy radians"""
+        if (rec := replay.recorder()) is not None:
+            rec.look(dx, dy)
+        cls.FACING[0] += dx
+        pitch = cls.FACING[1] + dy
         # limit vertical view to +/- 45 deg of horizon
-        if abs(dy) < (math.pi / 4):
-            cls.FACING[1] = dy
+        if abs(pitch) < (math.pi / 4):
+            cls.FACING[1] = pitch
+
+    @classmethod
+    def mouse_motion(cls, vp: "PlayerView", dx: int, dy: int):
+        """Turn by a frame's worth of pointer travel, in pixels"""
+        cls.look(
+            math.radians(dx * opts.x_sens),
+            math.radians(dy * opts.y_sens),
+        )
 
 __event_scripts: DefaultDict[Callable, list] = collections.defaultdict(list)
 __global_event_lock = asyncio.Condition()
 
+def reset_event_scripts():
+    """Start over on a new event loop, e.g. after a reload"""
+    global __global_event_lock
+    __global_event_lock = asyncio.Condition()
+
 def init_global_event_scripts(map):
     loop = asyncio.get_event_loop()
     for routine in __event_scripts[OngoingGlobal]:
@@ -216,8 +241,23 @@ def OngoingEachPlayer(*conditions: Callable[["EventPlayer"], None]):
 
 Number = Union[int, float]
 
-def players_within_radius(map, row, col, radius, ignore_walls=True):
-    pass
+def players_within_radius(
+    map, row: int, col: int, radius: Number, ignore_walls=True
+) -> List["EventPlayer"]:
+    """
+    Event players whose entity is within radius of (row, col). Unless
+    ignore_walls is set, only the ones with a line of sight to it.
+    """
+    radius2 = radius * radius
+    near = [
+        entity
+        for entity in map.entities
+        if getattr(entity, "event_player", None) is not None
+        and (entity.row - row) ** 2 + (entity.col - col) ** 2 <= radius2
+    ]
+    if not ignore_walls:
+        near = map.visible_entities(row, col, near)
+    return [entity.event_player for entity in near]
 
 def chase_variable_at_rate(
         getter:Callable[[], Number],
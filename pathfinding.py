@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Shortest paths over the walkable cells of a map.
+
+A flow field is a breadth-first search out from one target cell, and every
+entity chasing that target shares it: each step is a look-up of which
+neighbouring cell is one move closer. The search runs on the whole map at
+once, with the map as one big int of bits (bit row * width + col), so each
+ring of the search is a handful of shifts and masks rather than a visit to
+every cell. The field keeps the cells reached within k moves for every k,
+which is all a step needs.
+
+Fields are grown as far as they're asked about and no further: a field
+starts as just its target, and a question about a cell beyond the rings
+searched so far carries the search on until it reaches that cell or runs
+out of cells. Hunters chasing a target a few moves away cost a few rings,
+however big the map.
+
+Fields aren't repaired when their target moves, they're started again for
+the new cell. On a grid of four-way moves every cell's distance to a
+target changes by exactly one when the target moves a cell (the distance
+to neighbouring cells always differs in parity), so a repair would have to
+touch every cell the old field reached, where a new field only searches
+as far as the hunters are. Walls never change and entities don't block
+each other's moves, so nothing else can make a field stale.
+
+For a single path between two cells, path() is a plain A* search.
+"""
+
+import collections
+import heapq
+from typing import Container, Dict, List, Optional, Sequence, Tuple
+
+from rq_utils import KEY_DICT
+
+Cell = Tuple[int, int]
+
+# Moves an entity can make, in the order ties are broken
+MOVES = (
+    (-1, 0, KEY_DICT["up"]),
+    (0, -1, KEY_DICT["left"]),
+    (1, 0, KEY_DICT["down"]),
+    (0, 1, KEY_DICT["right"]),
+)
+
+
+class FlowField:
+    """
+    Moves to target from anywhere that can reach it. The search is carried
+    on as far as the cells asked about need it to go.
+    """
+
+    def __init__(self, service: "PathService", target: Cell) -> None:
+        self.target = target
+        self._width = width = service.width
+        self._height = service.height
+        self._not_first_col = service.not_first_col
+        self._not_last_col = service.not_last_col
+        row, col = target
+        self._frontier = 1 << (row * width + col)
+        self._unreached = service.walkable & ~self._frontier
+        # levels[k]: every cell within k moves of the target, for as many
+        # rings as have been searched
+        self.levels = [self._frontier]
+
+    def _grow(self, bit: int) -> bool:
+        """Search further rings until one reaches bit. False if none does"""
+        levels, width = self.levels, self._width
+        frontier, unreached = self._frontier, self._unreached
+        not_first, not_last = self._not_first_col, self._not_last_col
+        reached = levels[-1]
+        while frontier and not (reached >> bit) & 1:
+            frontier = (
+                ((frontier & not_last) << 1)
+                | ((frontier & not_first) >> 1)
+                | (frontier << width)
+                | (frontier >> width)
+            ) & unreached
+            if frontier:
+                unreached ^= frontier
+                reached |= frontier
+                levels.append(reached)
+        self._frontier, self._unreached = frontier, unreached
+        return bool((reached >> bit) & 1)
+
+    def distance(self, row: int, col: int) -> Optional[int]:
+        """Moves from (row, col) to the target, None if it can't get there"""
+        bit = row * self._width + col
+        levels = self.levels
+        if not (0 <= row < self._height and 0 <= col < self._width):
+            return None
+        if not (levels[-1] >> bit) & 1 and not self._grow(bit):
+            return None
+        lo, hi = 0, len(levels) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (levels[mid] >> bit) & 1:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def step(self, row: int, col: int) -> Optional[str]:
+        """The move (a KEY_DICT direction) one closer to the target, if any"""
+        dist = self.distance(row, col)
+        if not dist:
+            return None
+        closer = self.levels[dist - 1]
+        for d_row, d_col, move in MOVES:
+            n_row, n_col = row + d_row, col + d_col
+            if 0 <= n_row < self._height and 0 <= n_col < self._width:
+                if (closer >> (n_row * self._width + n_col)) & 1:
+                    return move
+        return None
+
+
+class PathService:
+    """
+    Flow fields and A* paths over a map's lines. Fields are cached by the
+    cell they lead to.
+    """
+
+    FIELDS = 8
+
+    def __init__(self, lines: Sequence[str], blocked: Container[str]) -> None:
+        self.height, self.width = len(lines), len(lines[0])
+        self._lines = lines
+        self._blocked = blocked
+        walkable = 0
+        for i, line in enumerate(lines):
+            bits = "".join("0" if ch in blocked else "1" for ch in reversed(line))
+            walkable |= int(bits, 2) << (i * self.width)
+        self.walkable = walkable
+        first_col = int("0" * (self.width - 1) + "1", 2)
+        last_col = first_col << (self.width - 1)
+        every_row = sum(1 << (i * self.width) for i in range(self.height))
+        everything = (1 << (self.height * self.width)) - 1
+        self.not_first_col = everything ^ (first_col * every_row)
+        self.not_last_col = everything ^ (last_col * every_row)
+        # Most recently used last
+        self._fields: "collections.OrderedDict[Cell, FlowField]" = (
+            collections.OrderedDict()
+        )
+
+    def is_walkable(self, row: int, col: int) -> bool:
+        return (
+            0 <= row < self.height
+            and 0 <= col < self.width
+            and self._lines[row][col] not in self._blocked
+        )
+
+    def field(self, row: int, col: int) -> FlowField:
+        """The flow field toward (row, col)"""
+        target = row, col
+        field = self._fields.get(target)
+        if field is None:
+            field = self._fields[target] = FlowField(self, target)
+            if len(self._fields) > self.FIELDS:
+                self._fields.popitem(last=False)
+        else:
+            self._fields.move_to_end(target)
+        return field
+
+    def step(self, row: int, col: int, target: Cell) -> Optional[str]:
+        """The move from (row, col) along a shortest path to target, if any"""
+        return self.field(*target).step(row, col)
+
+    def path(
+        self, start: Cell, goal: Cell, max_visits: int = 20000
+    ) -> Optional[List[Cell]]:
+        """
+        Cells from start to goal, both included, along a shortest path.
+        None if there's no path, or none was found within max_visits cells.
+        """
+        goal_row, goal_col = goal
+        came_from: Dict[Cell, Optional[Cell]] = {start: None}
+        cost = {start: 0}
+        # (estimated total, moves so far, cell); Manhattan distance never
+        # overestimates on a 4-connected grid
+        heap = [(abs(start[0] - goal_row) + abs(start[1] - goal_col), 0, start)]
+        visits = 0
+        while heap:
+            _, moves, cell = heapq.heappop(heap)
+            if cell == goal:
+                path = []
+                step: Optional[Cell] = cell
+                while step is not None:
+                    path.append(step)
+                    step = came_from[step]
+                return path[::-1]
+            if moves > cost[cell]:
+                continue
+            visits += 1
+            if visits > max_visits:
+                return None
+            row, col = cell
+            for d_row, d_col, _ in MOVES:
+                nxt = (row + d_row, col + d_col)
+                if nxt != goal and not self.is_walkable(*nxt):
+                    continue
+                if moves + 1 < cost.get(nxt, moves + 2):
+                    cost[nxt] = moves + 1
+                    came_from[nxt] = cell
+                    estimate = abs(nxt[0] - goal_row) + abs(nxt[1] - goal_col)
+                    heapq.heappush(heap, (moves + 1 + estimate, moves + 1, nxt))
+        return None
@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Session recording and headless replay.
+
+A replay log is one or more sessions back to back, e.g. one per reload of
+the game. A session is a header (magic, version, RNG seed, map file)
+followed by events. Every event starts with its kind and the microseconds elapsed since
+the previous event:
+
+    THROTTLE    index, value            Camera.set_throttle
+    BUTTON      button, state           Camera.set_button
+    LOOK        dx, dy (radians)        Camera.look
+    BIND        entity uid              Camera.bind
+    QUEUE       entity uid, direction   Entity.queue_move (event scripts)
+    STEP        entity uid, velocity    EventPlayer.step
+    TICK                                Map.move_all
+
+Inputs and simulation steps are logged in the order they happened, so
+feeding the log back reproduces the session without a window or a clock.
+No event kind is the first byte of MAGIC, which is how a reader tells the
+next session's header from an event.
+"""
+
+import enum
+import random
+import struct
+import time
+from typing import TYPE_CHECKING, BinaryIO, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from characters import Entity
+    from game_io import EventPlayer
+
+MAGIC = b"RQRP"
+VERSION = 2
+
+HEADER = struct.Struct("<4sBQH")  # magic, version, seed, len(map file name)
+EVENT = struct.Struct("<BI")  # kind, microseconds since previous event
+
+
+class Event(enum.IntEnum):
+    THROTTLE = 0
+    BUTTON = 1
+    LOOK = 2
+    BIND = 3
+    QUEUE = 4
+    STEP = 5
+    TICK = 6
+
+
+PAYLOAD = {
+    Event.THROTTLE: struct.Struct("<Bb"),
+    Event.BUTTON: struct.Struct("<H?"),
+    Event.LOOK: struct.Struct("<dd"),
+    Event.BIND: struct.Struct("<H"),
+    Event.QUEUE: struct.Struct("<HB"),
+    Event.STEP: struct.Struct("<Hd"),
+    Event.TICK: struct.Struct("<"),
+}
+
+
+def _directions() -> List[str]:
+    from rq_utils import KEY_DICT
+
+    return list(KEY_DICT.values())
+
+
+class Recorder:
+    """Appends events to a replay log"""
+
+    def __init__(self, fp: BinaryIO, seed: int, map_file_name: str) -> None:
+        self._fp = fp
+        self.filename = fp.name
+        self.seed = seed
+        self._last = time.perf_counter()
+        self._directions = _directions()
+        name = map_file_name.encode()
+        fp.write(HEADER.pack(MAGIC, VERSION, seed, len(name)) + name)
+
+    def _write(self, kind: Event, *args: Union[int, float]) -> None:
+        now = time.perf_counter()
+        elapsed = min(int((now - self._last) * 1e6), 0xFFFFFFFF)
+        self._last = now
+        self._fp.write(EVENT.pack(kind, elapsed) + PAYLOAD[kind].pack(*args))
+
+    def throttle(self, index: int, value: int) -> None:
+        self._write(Event.THROTTLE, index, value)
+
+    def button(self, button: int, state: bool) -> None:
+        self._write(Event.BUTTON, button, state)
+
+    def look(self, dx: float, dy: float) -> None:
+        self._write(Event.LOOK, dx, dy)
+
+    def bind(self, evp: "EventPlayer") -> None:
+        self._write(Event.BIND, evp.entity.uid)
+
+    def queue_move(self, entity: "Entity", direction: str) -> None:
+        self._write(Event.QUEUE, entity.uid, self._directions.index(direction))
+
+    def step(self, evp: "EventPlayer") -> None:
+        self._write(Event.STEP, evp.entity.uid, evp.velocity)
+
+    def tick(self) -> None:
+        self._write(Event.TICK)
+        # Ticks are rare enough that flushing here costs nothing, and a crash
+        # loses at most a tenth of a second
+        self._fp.flush()
+
+    def close(self) -> None:
+        self._fp.close()
+
+
+_recorder: Optional[Recorder] = None
+
+
+def recorder() -> Optional[Recorder]:
+    """The active recorder, or None when not recording"""
+    return _recorder
+
+
+def record(
+    filename: str,
+    map_file_name: str,
+    seed: Optional[int] = None,
+    append: bool = False,
+) -> Recorder:
+    """
+    Start recording to filename, as a new session after those already in it
+    if append is set. The Map must be built with the recorder's seed. The
+    global RNG is seeded too, for anything still drawing from it.
+    """
+    global _recorder
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    random.seed(seed)
+    _recorder = Recorder(open(filename, "ab" if append else "wb"), seed, map_file_name)
+    return _recorder
+
+
+def stop() -> None:
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+Session = Tuple[int, str, List[Tuple[Event, float, tuple]]]
+
+
+def read(filename: str) -> List[Session]:
+    """
+    Returns every session in the log, as
+    (seed, map file name, [(kind, seconds since start, payload)])
+    """
+    with open(filename, "rb") as fp:
+        data = fp.read()
+    sessions: List[Session] = []
+    offset = 0
+    while offset < len(data):
+        magic, version, seed, name_len = HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a version {VERSION} replay log")
+        offset += HEADER.size
+        map_file_name = data[offset : offset + name_len].decode()
+        offset += name_len
+
+        events = []
+        now = 0.0
+        while offset < len(data) and data[offset] != MAGIC[0]:
+            code, elapsed = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            kind = Event(code)
+            payload = PAYLOAD[kind].unpack_from(data, offset)
+            offset += PAYLOAD[kind].size
+            now += elapsed / 1e6
+            events.append((kind, now, payload))
+        sessions.append((seed, map_file_name, events))
+    return sessions
+
+
+def play(filename: str, session: int = 0) -> List[Tuple[Event, float, float]]:
+    """
+    Feed a session of a replay log back through the simulation as fast as
+    possible.
+
+    Nothing is drawn and nothing waits on the clock. Returns
+    (kind, time in session, seconds taken) for every STEP and TICK.
+    """
+    import asyncio
+    import contextlib
+    import io
+    import game_map
+    import lib_rq
+    from game_io import Button, EventPlayer
+
+    seed, map_file_name, events = read(filename)[session]
+    # Camera.bind and EventPlayer spawn tasks; park them on a loop that
+    # never runs
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    random.seed(seed)
+
+    directions = _directions()
+    timings: List[Tuple[Event, float, float]] = []
+    try:
+        rq_map = game_map.Map(map_file_name, seed=seed)
+        by_uid = {entity.uid: entity for entity in rq_map.entities}
+        players = {
+            uid: EventPlayer(entity, map=rq_map) for uid, entity in by_uid.items()
+        }
+        camera = lib_rq.Camera
+        # Contact messages still get built (they draw from the RNG), just
+        # not shown
+        with contextlib.redirect_stdout(io.StringIO()):
+            for kind, now, payload in events:
+                if kind == Event.THROTTLE:
+                    camera.set_throttle(*payload)
+                elif kind == Event.BUTTON:
+                    camera.set_button(Button(payload[0]), payload[1])
+                elif kind == Event.LOOK:
+                    camera.look(*payload)
+                elif kind == Event.BIND:
+                    camera.bind(players[payload[0]])
+                elif kind == Event.QUEUE:
+                    uid, direction = payload
+                    by_uid[uid].move_queue.append(directions[direction])
+                elif kind == Event.STEP:
+                    evp = players[payload[0]]
+                    evp.velocity = payload[1]
+                    start = time.perf_counter()
+                    evp.step()
+                    timings.append((kind, now, time.perf_counter() - start))
+                elif kind == Event.TICK:
+                    start = time.perf_counter()
+                    alive = rq_map.move_all(draw=False)
+                    timings.append((kind, now, time.perf_counter() - start))
+                    if not alive:
+                        break
+    finally:
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+        asyncio.set_event_loop(None)
+    return timings
+
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Replay a recorded session")
+    parser.add_argument("log", help="Replay log written with --record")
+    parser.add_argument(
+        "--spikes",
+        type=int,
+        default=5,
+        help="Number of slowest ticks to list",
+    )
+    parser.add_argument(
+        "--session",
+        type=int,
+        help="Replay only this session of the log (from 0), not every one",
+    )
+    optarg = parser.parse_args()
+
+    count = len(read(optarg.log))
+    for session in range(count) if optarg.session is None else [optarg.session]:
+        print(f"session {session + 1} of {count}")
+        start = time.perf_counter()
+        timings = play(optarg.log, session)
+        total = time.perf_counter() - start
+        for kind in (Event.STEP, Event.TICK):
+            taken = [t for k, _, t in timings if k == kind]
+            if taken:
+                print(
+                    f"{kind.name:5} n={len(taken):6d} "
+                    f"mean={statistics.mean(taken) * 1e3:.3f}ms "
+                    f"max={max(taken) * 1e3:.3f}ms"
+                )
+        print(f"replayed in {total:.3f}s")
+        ticks = sorted(
+            (t for t in timings if t[0] == Event.TICK),
+            key=lambda t: t[2],
+            reverse=True,
+        )
+        for _, now, seconds in ticks[: optarg.spikes]:
+            print(f"  tick @ {now:9.3f}s took {seconds * 1e3:.3f}ms")
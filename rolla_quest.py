@@ -5,6 +5,7 @@ import sys
 import game_map
 import ascii_art
 import lib_rq, rq_engine
+import replay
 import logging
 from game_io import EventPlayer
 import asyncio
@@ -67,12 +68,12 @@ def nosprint(player: EventPlayer):
     lambda player: isinstance(player.entity, AdminSmith),
     lambda player: min(
         player.entity.distance(other)
-        for other in AdminSmith.adminsmiths if other != player.entity
+        for other in player.map.registry.of_type(AdminSmith) if other != player.entity
     ) > 3,
 )
 def chase_smith(player: EventPlayer):
     nearest = min(
-        (sm for sm in AdminSmith.adminsmiths if sm != player.entity),
+        (sm for sm in player.map.registry.of_type(AdminSmith) if sm != player.entity),
         key=lambda k: player.entity.distance(k)
     )
     this_row, this_col = player.entity.row, player.entity.col
@@ -96,7 +97,7 @@ def chase_smith(player: EventPlayer):
 def hack_drone(player):
     player.using_ability |= Button.ABILITY_3
     nearest_drone = min(
-        (entity for entity in player.map.entities if entity != player.entity and isinstance(entity, PoliceDrone)), 
+        player.map.registry.of_type(PoliceDrone),
         key=lambda e: player.entity.distance(e)
     )
     lib_rq.Camera.bind(nearest_drone.event_player)
@@ -110,7 +111,24 @@ def hack_drone(player):
 
 
 def main() -> None:
-    rq_map = game_map.Map("maps/reversed_mst_campus.txt")
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scroll",
+        action="store_true",
+        help="Scroll the text map with the player instead of paging by chunk",
+    )
+    parser.add_argument(
+        "--record",
+        help="Record the session to a replay log (see replay.py)",
+    )
+    optarg = parser.parse_args()
+    map_file_name = "maps/reversed_mst_campus.txt"
+    seed = None
+    if optarg.record is not None:
+        seed = replay.record(optarg.record, map_file_name).seed
+    rq_map = game_map.Map(map_file_name, scroll=optarg.scroll, seed=seed)
     rq_engine.main(rq_map)
 
 
@@ -1,16 +1,25 @@
+import functools
 import math
-from game_map import Map
+from game_map import Map, OccupancyPyramid
 import os
 import logging.config, logging
-from typing import Callable, TYPE_CHECKING, Tuple
+from typing import Callable, Dict, List, Sequence, Set, TYPE_CHECKING, Tuple
 from graphics import Res
 import tkinter as tk
 import tk_io
 from game_io import EventPlayer
+from characters import Player
 import asyncio
 import ctypes
 import rq_ui
-from graphics import GPU, BYTES_PER_PIX
+import replay
+from graphics import (
+    GPU,
+    BYTES_PER_PIX,
+    ResolutionController,
+    parse_cores,
+    scaled_sizes,
+)
 from ctypes import (
     c_float,
     c_uint8,
@@ -62,31 +71,92 @@ def xset_shield(fn):
     return inner
 
 RENDER_SCALE = 2
+# Share of the draw distance kept at each step of detail the resolution
+# controller gives up
+DRAW_DIST_LOD = (1.0, 0.75, 0.5)
 
 @xset_shield
 def main(
     map: Map,
     dev=False, # Set to True to bypass option menu
     logconf=None,
-    ncores=8,
-    player=None
+    ncores="8",  # "[fork|spawn|thread:]count"
+    player=None,
+    accel="field",  # one of ACCEL
+    indexed=False,  # Render palette indices rather than RGB
+    adaptive_res=False,  # Trade resolution and draw distance for frame time
 ):
-    from lib_rq import Camera
     import lib_rq
     
     opts = rq_ui.user_options()
-    opts.dev = dev
     opts.logconf = logconf if logconf is not None else opts.logconf
     opts.ncores = ncores
+    opts.accel = accel
+    opts.indexed = indexed
+    opts.adaptive_res = adaptive_res
     opts.renderscale = RENDER_SCALE
 
-    players = [EventPlayer(entity, map=map) for entity in map.entities]
+    backend, cores = parse_cores(ncores)
+    # The workers start once, before any window exists, and are kept across
+    # reloads. Sized for the largest resolution so any choice in the menu fits
+    with RenderEngine(
+            max(Res, key=lambda r: r.size),
+            cores,
+            KernelArgs(map, accel).size,
+            KernelArgs(map, accel),
+            backend,
+            1 if indexed else BYTES_PER_PIX,
+    ) as gpu:
+        while True:
+            try:
+                return _session(map, gpu, dev)
+            except lib_rq.ReloadEvent:
+                map = _reload(map)
+
+
+def _reload(map: Map) -> Map:
+    """A new map for the next session, recorded after this one if it was"""
+    seed = None
+    if (rec := replay.recorder()) is not None:
+        replay.stop()
+        seed = replay.record(rec.filename, map.map_file_name, append=True).seed
+    return Map(map.map_file_name, scroll=map.scroll, seed=seed)
+
+
+def _session(map: Map, gpu: "RenderEngine", dev: bool):
+    """Play on map until the window closes. Raises ReloadEvent on reload"""
+    import lib_rq
+
+    opts = rq_ui.user_options()
+    opts.dev = dev
+    # Tasks of the last session died with its loop. This one waits in Tk
+    loop = asyncio.SelectorEventLoop(tk_io.TkSelector())
+    asyncio.set_event_loop(loop)
+    lib_rq.reset_event_scripts()
+    try:
+        _play(map, gpu)
+    finally:
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+        asyncio.set_event_loop(None)
+
 
-    Camera.bind(players[0])
+def _play(map: Map, gpu: "RenderEngine"):
+    from lib_rq import Camera
+    import lib_rq
+
+    opts = rq_ui.user_options()
+    players = {entity.uid: EventPlayer(entity, map=map) for entity in map.entities}
+    # Map.entities is in no particular order
+    (player,) = map.registry.of_type(Player)
+    Camera.bind(players[player.uid])
 
     win = tk_io.GameWin(className=" ")
     win.geometry(str(RES))
-    if not dev:
+    if not opts.dev:
         rq_ui.get_user_options()
        
     else:
@@ -94,6 +164,7 @@ def main(
 
     viewport = rq_ui.init_game_ui(); rq_ui.bind_keys(viewport, Camera)
     frame_time = tk.DoubleVar()
+    render_res = tk.StringVar()
     evp_x = tk.DoubleVar()
     evp_y = tk.DoubleVar()
     evp_z = tk.DoubleVar()
@@ -117,6 +188,7 @@ def main(
         "%(levelname)-8s %(asctime)s - %(message)s",
         variables=[
             (frame_time, "Frame Time"),
+            (render_res, "Render Res"),
             (evp_x, "pos.X | entity.col"),
             (evp_z, "pos.Z | entity.row"),
             (evp_y, "pos.Y"),
@@ -139,48 +211,104 @@ def main(
    
     # lock mouse to center, enable io handlers
     viewport.acquire()
-    logger.info(f"Map @ {map.width}x{map.height}")
+    logger.info("Map @ %dx%d", map.width, map.height)
     camera_size = ctypes.sizeof(Camera)
     map_size = ctypes.sizeof(map.ByteMap)
+    kernel_args = KernelArgs(map, opts.accel)
 
     viewport.on_motion = Camera.mouse_motion
 
     lib_rq.init_global_event_scripts(map)
     win.update()
-    def arguments(buf: bytearray):
-        return (
-            Camera.from_buffer(buf),
-            map.ByteMap.from_buffer(buf, camera_size),
+    gpu.configure(opts.res, kernel_args.size, kernel_args)
+
+    timer = tk_io.loop_time()
+    data_in, data_out = bytearray(), bytearray()
+    controller = None
+    if opts.adaptive_res:
+        controller = ResolutionController(
+            scaled_sizes(opts.res),
+            opts.target_frame_time,
+            lod_steps=len(DRAW_DIST_LOD) - 1,
         )
+    Camera.DRAW_DIST = opts.draw_dist
     
-    try:
-        with RenderEngine(
-                opts.res,
-                ncores, 
-                camera_size + map_size,
-                arguments,
-                opts.renderscale,
-        ) as gpu:
-            timer = tk_io.loop_time()
-            data_in, data_out = bytearray(), bytearray()
-            
-            def render():
-                frame_time.set(timer())
-                set_vars()
-
-                data = map.byte_dump()
-                data_in[:camera_size] = bytearray(Camera())
-                data_in[camera_size:camera_size + map_size] = data
-                gpu(data_in, data_out)
-                viewport.draw(data_out)
-            win.mainloop(render)
-
-    except lib_rq.ReloadEvent:
-        # Need to make sure the with statement above properly exits before
-        # restarting. Otherwise the shared memory never gets released
-        import os, sys
-        python = sys.executable
-        os.execl(python, python, *sys.argv)
+    async def render():
+        frame_time.set(timer())
+        set_vars()
+        viewport.apply_motion()
+
+        data = map.byte_dump()
+        data_in[:camera_size] = bytearray(Camera())
+        data_in[camera_size:camera_size + map_size] = data
+        data_in[camera_size + map_size:] = kernel_args.accel_data(map, data)
+        await gpu.submit(data_in, data_out)
+        viewport.draw(
+            data_out,
+            gpu.width,
+            gpu.height,
+            PALETTE_TABLES if opts.indexed else None,
+        )
+        render_res.set(f"{gpu.width}x{gpu.height}")
+        if controller is not None:
+            gpu.resize(*controller(gpu.render_time))
+            Camera.DRAW_DIST = int(opts.draw_dist * DRAW_DIST_LOD[controller.lod])
+    win.mainloop(render)
+
+
+# How rays get across open ground: striding by the map's distance field, or
+# skipping empty blocks of its occupancy pyramid
+ACCEL = ("field", "pyramid")
+
+
+class KernelArgs:
+    """
+    Views the kernel input as (Camera, ByteMap, accel), where accel is the
+    distance field or the occupancy pyramid flags. A plain class rather than
+    a closure so it can be pickled for spawned workers.
+    """
+
+    def __init__(self, map: Map, accel: str = "field"):
+        if accel not in ACCEL:
+            raise ValueError(f"unknown ray acceleration {accel!r}")
+        self.rows, self.cols = map.height, map.width
+        self.accel = accel
+
+    @property
+    def size(self) -> int:
+        """Bytes of kernel input"""
+        from lib_rq import Camera
+
+        cells = self.rows * self.cols
+        if self.accel == "field":
+            accel_size = cells
+        else:
+            accel_size = OccupancyPyramid.size(self.rows, self.cols)
+        return ctypes.sizeof(Camera) + cells + accel_size
+
+    def accel_data(self, map: Map, dump: bytearray) -> bytearray:
+        """What goes after the map bytes of a frame"""
+        if self.accel == "field":
+            return map.distance_field.update(dump)
+        return map.occupancy.data
+
+    def __call__(self, buf: bytearray):
+        from lib_rq import Camera
+
+        ByteMap = (c_uint8 * self.cols) * self.rows
+        camera = Camera.from_buffer(buf)
+        offset = ctypes.sizeof(Camera)
+        map = ByteMap.from_buffer(buf, offset)
+        offset += ctypes.sizeof(ByteMap)
+        return camera, map, memoryview(buf)[offset : self.size]
+
+    def __eq__(self, other):
+        return isinstance(other, KernelArgs) and (
+            self.rows,
+            self.cols,
+            self.accel,
+        ) == (other.rows, other.cols, other.accel)
+
 
 # TODO sin/cos table and grey scale table
 def cos(r):
@@ -201,14 +329,297 @@ def squash(x):
     return x / (x + 1)
 
 
+FOG_COLOR = [170, 190, 200]
+FOG = bytes(FOG_COLOR)
+# Fraction of the draw distance that is clear of fog
+FOG_START = 0.5
+
+
+def fog(color, weight: float) -> bytes:
+    """color with weight (0 to 1) of the fog mixed in"""
+    return bytes(int(c + (f - c) * weight) for c, f in zip(color, FOG_COLOR))
+
+
+@functools.lru_cache(maxsize=8)
+def fog_ramp(draw_dist: int) -> List[float]:
+    """Fog weight of each step of a ray, up to draw_dist"""
+    start = int(draw_dist * FOG_START)
+    return [
+        max(0.0, (j - start) / max(1, draw_dist - start))
+        for j in range(draw_dist + 1)
+    ]
+
+
+@functools.lru_cache(maxsize=8)
+def fogged_greys(draw_dist: int) -> List[List[bytes]]:
+    """GREY_SCALE[g] seen from step j of a ray, as [g][j]"""
+    return [[fog(grey, w) for w in fog_ramp(draw_dist)] for grey in GREY_SCALE]
+
+
+BLANK = ord(" ")
+
+# What a ray ran into
+HIT_BOUND, HIT_WALL, HIT_SPRITE = range(3)
+
+# By map byte, what a ray stops at (HIT_* or None) and the colour of sprites
+CELL_KIND: List = [None] * 256
+PALETTE: List = [None] * 256
+for ch in Map.BOUND_CHAR:
+    CELL_KIND[ord(ch)] = HIT_BOUND
+for ch in Map.WALL_CHAR:
+    CELL_KIND[ord(ch)] = HIT_WALL
+assert sprites.keys() == Map.SPRITE_CHAR
+for ch in Map.SPRITE_CHAR:
+    CELL_KIND[ord(ch)] = HIT_SPRITE
+    PALETTE[ord(ch)] = sprites[ch].color
+
+# The indexed raster's palette: SHADES steps each of the sky and ground
+# gradients, then every GREY_SCALE grey and sprite colour at evenly spaced
+# fog weights. The sprite shading by distance is left out, it's slight.
+# Backdrop steps are even in the square root of the distance from the
+# horizon, which keeps them close where squash changes fastest
+SHADES = 24
+SHADE_STEPS = [squash((k / 2) ** 2) for k in range(SHADES)]
+WALL_FOGS = 16
+SPRITE_FOGS = 8
+SPRITE_SLOT = {ord(ch): slot for slot, ch in enumerate(sprites)}
+SKY_INDEX = 0
+GROUND_INDEX = SKY_INDEX + SHADES
+WALL_INDEX = GROUND_INDEX + SHADES
+SPRITE_INDEX = WALL_INDEX + len(GREY_SCALE) * WALL_FOGS
+INDEXED_PALETTE = (
+    [[int(gs * x) for x in SKY_COLOR] for gs in SHADE_STEPS]
+    + [[int(gs * x) for x in GROUND_COLOR] for gs in SHADE_STEPS]
+    + [
+        fog(grey, k / (WALL_FOGS - 1))
+        for grey in GREY_SCALE
+        for k in range(WALL_FOGS)
+    ]
+    + [
+        fog(PALETTE[cell], k / (SPRITE_FOGS - 1))
+        for cell in SPRITE_SLOT
+        for k in range(SPRITE_FOGS)
+    ]
+)
+assert len(INDEXED_PALETTE) <= 256
+PALETTE_TABLES = tk_io.palette_tables(INDEXED_PALETTE)
+# Fully fogged is the fog colour
+FOG_INDEX = bytes([WALL_INDEX + WALL_FOGS - 1])
+
+
+def level(weight: float, levels: int) -> int:
+    """Nearest of levels evenly spaced steps from 0 to 1"""
+    return round(weight * (levels - 1))
+
+
+class ColumnShader:
+    """
+    Height and colour of a column from what its ray hit and at which step.
+
+    Everything that depends on the step alone is tabled once per camera scale
+    (camera.dist * cos(pitch)), screen height, draw distance and pixel
+    format. Sprite colours are filled in as they're first seen. Colours are
+    bytes as written to the raster, RGB or a palette index.
+    """
+
+    fog: bytes
+    walls: List[bytes]
+
+    def __init__(self, engine: "RenderEngine", scale: float, draw_dist: int):
+        self.indexed = engine.bytes_per_pix == 1
+        self.key = engine.height, scale, draw_dist, self.indexed
+        # Distance of every step, pulled in as the camera pitches
+        self._dists = [j * scale for j in range(draw_dist + 1)]
+        self.heights = [engine.get_apparent_height(1, dist) for dist in self._dists]
+        self._ramp = fog_ramp(draw_dist)
+        shades = [0] + [int(math.log(dist)) for dist in self._dists[1:]]
+        if self.indexed:
+            self.fog = FOG_INDEX
+            self.walls = [
+                bytes([WALL_INDEX + g * WALL_FOGS + level(w, WALL_FOGS)])
+                for g, w in zip(shades, self._ramp)
+            ]
+        else:
+            self.fog = FOG
+            greys = fogged_greys(draw_dist)
+            self.walls = [greys[g][j] for j, g in enumerate(shades)]
+        self._sprites: Dict[Tuple[int, int], bytes] = {}
+
+    def sprite(self, cell: int, j: int) -> bytes:
+        color = self._sprites.get((cell, j))
+        if color is None:
+            if self.indexed:
+                color = bytes(
+                    [
+                        SPRITE_INDEX
+                        + SPRITE_SLOT[cell] * SPRITE_FOGS
+                        + level(self._ramp[j], SPRITE_FOGS)
+                    ]
+                )
+            else:
+                gs = squash(self._dists[j])
+                color = fog([gs * x for x in PALETTE[cell]], self._ramp[j])
+            self._sprites[cell, j] = color
+        return color
+
+    def backdrop(self, d: float) -> bytes:
+        """Sky or ground colour d pixels below the horizon"""
+        if self.indexed:
+            shade = min(SHADES - 1, round(2 * math.sqrt(abs(d))))
+            return bytes([(GROUND_INDEX if d > 0 else SKY_INDEX) + shade])
+        gs = squash(abs(d))
+        return bytes(int(gs * x) for x in (GROUND_COLOR if d > 0 else SKY_COLOR))
+
+    def __call__(self, hits) -> List[tuple]:
+        """(map byte, step, height, colour) of each (kind, map byte, step)"""
+        heights, walls, sprite, fog = self.heights, self.walls, self.sprite, self.fog
+        return [
+            (
+                cell,
+                j,
+                heights[j],
+                fog
+                if kind is None
+                else sprite(cell, j)
+                if kind == HIT_SPRITE
+                else walls[j],
+            )
+            for kind, cell, j in hits
+        ]
+
+
+def _changed_cells(old: bytes, new: bytes, width: int) -> Set[int]:
+    """Flat indices of the cells that differ between two map dumps"""
+    changed = set()
+    for start in range(0, len(new), width):
+        end = start + width
+        if old[start:end] == new[start:end]:
+            continue
+        diff = int.from_bytes(old[start:end], "little") ^ int.from_bytes(
+            new[start:end], "little"
+        )
+        while diff:
+            low = (diff & -diff).bit_length() - 1
+            changed.add(start + low // 8)
+            diff &= ~(0xFF << (low - low % 8))
+    return changed
+
+
 class RenderEngine(GPU):
+    arg_factory: KernelArgs
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Per core, the camera and map of the last frame and its ray hits
+        self._hit_cache: Dict[int, tuple] = {}
+        # Per core, the frame, layout and columns last drawn into the raster
+        self._drawn: Dict[int, tuple] = {}
+        # Tables for the last camera scale seen, under their key. Shared by
+        # thread cores, which all see the same camera. A dict rather than an
+        # attribute, as each frame is drawn by a copy of the engine
+        self._shaders: Dict[tuple, ColumnShader] = {}
+
     def get_apparent_height(self, scale, dist):
         return ((self.height / (2 * math.pi * (dist + 1))) * 360) // 2
 
     def get_pixel_offset(self, row, col):
-        return (row * self.width * BYTES_PER_PIX * self.renderscale) + (
-            col * BYTES_PER_PIX * self.renderscale
-        )
+        return (row * self.width + col) * self.bytes_per_pix
+
+    def cast(
+        self,
+        map,
+        field,
+        c_x: float,
+        c_z: float,
+        radx: float,
+        repr_char: int,
+        draw_dist: int,
+    ):
+        """
+        March one ray out from (c_x, c_z), at most draw_dist steps. Returns
+        what it hit (HIT_* or None when nothing is in range), the map byte
+        there, the step it stopped at and the flat index of every cell it
+        looked at.
+
+        Steps are a cell long, but a cell d away from anything solid in the
+        distance field lets the ray skip the next d - 1 steps: they all land
+        within d - 1 cells of it, so none of them can hit.
+        """
+        width = len(map[0])
+        sin_x, cos_x = sin(radx), cos(radx)
+        path = []
+        j = 1
+        while j < draw_dist:
+            rc_x = j * sin_x + c_x
+            rc_y = j * cos_x + c_z
+            x, y = int(math.floor(rc_x)), int(math.floor(rc_y))
+            path.append(y * width + x)
+            cell = map[y][x]
+            kind = CELL_KIND[cell]
+            if kind is not None and (kind != HIT_SPRITE or cell != repr_char):
+                return kind, cell, j, path
+            j += field[y * width + x] or 1
+        return None, BLANK, draw_dist, path
+
+    def cast_blocks(
+        self,
+        map,
+        blocks,
+        levels,
+        c_x: float,
+        c_z: float,
+        radx: float,
+        repr_char: int,
+        draw_dist: int,
+    ):
+        """
+        cast, with the occupancy pyramid instead of the distance field. A
+        step landing in an empty block, tried coarsest first, moves straight
+        on to the first step past it. Looking at a block is recorded in the
+        path as the number of cells plus its index in blocks.
+        """
+        width = len(map[0])
+        cells = len(map) * width
+        sin_x, cos_x = sin(radx), cos(radx)
+        # Which edge of a block the ray leaves through: the far one (+1) going
+        # up an axis, the near one (+0) going down
+        edge_x, edge_z = int(sin_x > 0), int(cos_x > 0)
+        path = []
+        j = 1
+        while j < draw_dist:
+            rc_x = j * sin_x + c_x
+            rc_y = j * cos_x + c_z
+            x, y = int(math.floor(rc_x)), int(math.floor(rc_y))
+            cell = map[y][x]
+            # Only a blank cell can be in an empty block
+            if cell == BLANK:
+                for shift, offset, stride in levels:
+                    block_x, block_y = x >> shift, y >> shift
+                    block = offset + block_y * stride + block_x
+                    if blocks[block]:
+                        continue
+                    path.append(cells + block)
+                    # The step at which the ray crosses out of the block.
+                    # Rounding down can land short of it, never past it
+                    leave = float(draw_dist)
+                    if sin_x:
+                        leave = (((block_x + edge_x) << shift) - c_x) / sin_x
+                    if cos_x:
+                        leave = min(
+                            leave, (((block_y + edge_z) << shift) - c_z) / cos_x
+                        )
+                    j = max(j + 1, int(leave))
+                    break
+                else:
+                    path.append(y * width + x)
+                    j += 1
+                continue
+            path.append(y * width + x)
+            kind = CELL_KIND[cell]
+            if kind is not None and (kind != HIT_SPRITE or cell != repr_char):
+                return kind, cell, j, path
+            j += 1
+        return None, BLANK, draw_dist, path
 
     def device(self, idx: int, b_in: bytearray, b_out: bytearray):
         """
@@ -220,19 +631,56 @@ class RenderEngine(GPU):
         # write results to shared memory
 
         camera: Camera
-        camera, map = self.arg_factory(b_in)
+        camera, map, accel = self.arg_factory(b_in)
+        width = len(map[0])
+        if self.arg_factory.accel == "pyramid":
+            levels = OccupancyPyramid.layout(len(map), width)
 
         radians_per_pixel = math.radians(camera.fov) / self.width
         radian_offset = math.radians(camera.fov / 2) + math.radians(90 - camera.fov)
-        facing_offset = camera.facing[0]
-        start, end = self.block_X * idx, self.block_X * (idx + 1)
+        # The facing as whole pixel columns plus what's left over. A ray's
+        # angle is worked out from its column counted from angle 0, so after
+        # a turn of whole columns it is the very same float as the ray of
+        # the column it moved to, whichever core cast that
+        turn = math.floor(camera.facing[0] / radians_per_pixel)
+        facing_offset = camera.facing[0] - turn * radians_per_pixel
+        start, end = self.columns(idx)
 
         c_x, c_y, c_z = camera.position[0], camera.position[1], camera.position[2]
         f_y = camera.facing[1]
 
-        dist_to = [
-            (ord(" "), 100, 0, bytearray([0, 0, 0])) for _ in range(self.block_X)
-        ]
+        # Hits only depend on the ray and on the cells (or blocks) it looked
+        # at. Keep last frame's unless the camera moved, turned by part of a
+        # column, or one of those cells changed, so a hit is only ever
+        # reused for the exact ray it was cast for
+        draw_dist = camera.draw_dist
+        view = (
+            c_x,
+            c_z,
+            camera.repr_char,
+            radians_per_pixel,
+            radian_offset,
+            facing_offset,
+            draw_dist,
+        )
+        grid = bytes(map), bytes(accel)
+        last_view, last_grid, hits = self._hit_cache.get(idx, (None, None, {}))
+        if view != last_view:
+            hits = {}
+        elif grid != last_grid:
+            changed = _changed_cells(last_grid[0], grid[0], width)
+            accel_changed = _changed_cells(last_grid[1], grid[1], width)
+            if self.arg_factory.accel == "pyramid":
+                # Blocks are recorded after the cells
+                cells = len(grid[0])
+                accel_changed = {cells + block for block in accel_changed}
+            changed |= accel_changed
+            hits = {
+                key: hit for key, hit in hits.items() if changed.isdisjoint(hit[3])
+            }
+        frame_hits = {}
+
+        column_hits = []
         # Y shearing. Move the world view up/down depending on y direction.
         # Modeled as a camera rotating around the x axis.
         mid_y = (self.height // 2) - (sin(f_y) * self.height)
@@ -240,67 +688,67 @@ class RenderEngine(GPU):
         cos_fy = cos(f_y)
         # O(n) so not a big deal
         for i in range(start, end):
-            radx = radians_per_pixel * i + radian_offset + facing_offset
-            for j in range(1, 100):
-                rc_x = j * sin(radx) + c_x
-                rc_y = j * cos(radx) + c_z
-                x, y = int(math.floor(rc_x)), int(math.floor(rc_y))
-                ch = chr(map[y][x])
-                # Pull in screen as camera pitches
-                dist = j * camera.dist * cos_fy
-                gs = squash(dist)
-                if ch in Map.BOUND_CHAR:
-                    dist_to[i - start] = (
-                        map[y][x],
-                        j,
-                        self.get_apparent_height(0.5, dist),
-                        GREY_SCALE[int(math.log(dist))],
-                    )
-                    break
-                elif ch in Map.WALL_CHAR:
-                    dist_to[i - start] = (
-                        map[y][x],
-                        j,
-                        self.get_apparent_height(1, dist),
-                        GREY_SCALE[int(math.log(dist))],
-                    )
-                    break
-                elif ch in sprites and map[y][x] !=  camera.repr_char:
-                    dist_to[i - start] = (
-                        map[y][x],
-                        j,
-                        self.get_apparent_height(1, dist),
-                        bytearray(int(gs * x) for x in sprites[ch].color),
-                    )
-                    break
+            key = i + turn
+            radx = radians_per_pixel * key + radian_offset + facing_offset
+            hit = hits.get(key)
+            if hit is None and self.arg_factory.accel == "pyramid":
+                hit = self.cast_blocks(
+                    map, accel, levels, c_x, c_z, radx, camera.repr_char, draw_dist
+                )
+            elif hit is None:
+                hit = self.cast(
+                    map, accel, c_x, c_z, radx, camera.repr_char, draw_dist
+                )
+            frame_hits[key] = hit
+            column_hits.append(hit[:3])
+        # Only hits seen this frame are kept, which bounds the cache
+        self._hit_cache[idx] = view, grid, frame_hits
+
+        scale = camera.dist * cos_fy
+        indexed = self.bytes_per_pix == 1
+        shader_key = (self.height, scale, draw_dist, indexed)
+        shader = self._shaders.get(shader_key)
+        if shader is None:
+            shader = ColumnShader(self, scale, draw_dist)
+            self._shaders.clear()
+            self._shaders[shader_key] = shader
+        dist_to = shader(column_hits)
+
+        # Columns that look the same as what this core drew last frame are
+        # already in the raster
+        layout = (self.width, self.height, mid_y, start, end)
+        drawn_frame, drawn_layout, drawn = self._drawn.get(idx, (0, None, None))
+        redraw: Sequence[int]
+        if drawn_frame == self.frame - 1 and drawn_layout == layout:
+            redraw = [
+                k
+                for k, (column, last) in enumerate(zip(dist_to, drawn))
+                if column[2:] != last[2:]
+            ]
+        else:
+            redraw = range(end - start)
+        # Only set once the frame is fully drawn
+        self._drawn.pop(idx, None)
+
         # O(n^2). :(
-        for i in range(self.height):
-            for j, (ch, wall_dist, size, color) in enumerate(dist_to):
-                d = i - mid_y  # in pixels
-                dist_from_mid = abs(d)
-                gs = squash(dist_from_mid)
-                # Fake higher resolutions
-                for k in range(self.renderscale):
-                    off = self.get_pixel_offset(i * self.renderscale + k, j + start)
-                    # Draw sky, ground
-                    # This part can be optimized by drawing the entire scene before
-                    # entering this function. This way we only need to draw sprites
-                    if d > 0:
-                        self.set_color(
-                            b_out, off, bytearray(int(gs * x) for x in GROUND_COLOR)
-                        )
-                    else:
-                        self.set_color(
-                            b_out, off, bytearray(int(gs * x) for x in SKY_COLOR)
-                        )
-                    
-                    if dist_from_mid <= size:
-                        self.set_color(b_out, off, color)
+        for i in range(self.height) if redraw else ():
+            d = i - mid_y  # in pixels
+            dist_from_mid = abs(d)
+            # Draw sky, ground
+            # This part can be optimized by drawing the entire scene before
+            # entering this function. This way we only need to draw sprites
+            backdrop = shader.backdrop(d)
+            for j in redraw:
+                ch, wall_dist, size, color = dist_to[j]
+                off = self.get_pixel_offset(i, j + start)
+                if dist_from_mid <= size:
+                    self.set_color(b_out, off, color)
+                else:
+                    self.set_color(b_out, off, backdrop)
+        self._drawn[idx] = self.frame, layout, dist_to
 
     def set_color(self, d_out, offset, color):
-        d_out[offset : offset + BYTES_PER_PIX * self.renderscale] = (
-            color * self.renderscale
-        )
+        d_out[offset : offset + self.bytes_per_pix] = color
 
 
 def _init_logging(*logname_level, logconf=None):
@@ -332,10 +780,44 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--ncores",
-        type=int,
-        help="Number of stream processors",
-        default=8,
+        help=(
+            "Number of stream processors, optionally prefixed with the "
+            "backend running them: fork (default), spawn or thread, e.g. "
+            "thread:4"
+        ),
+        default="8",
+    )
+    parser.add_argument(
+        "--accel",
+        choices=ACCEL,
+        default="field",
+        help="How rays skip open ground",
+    )
+    parser.add_argument(
+        "--indexed",
+        action="store_true",
+        help="Render a byte per pixel into a fixed palette instead of RGB",
+    )
+    parser.add_argument(
+        "--adaptive-res",
+        action="store_true",
+        help="Lower the resolution, then the draw distance, when frames run slow",
+    )
+    parser.add_argument(
+        "--scroll",
+        action="store_true",
+        help="Scroll the text map with the player instead of paging by chunk",
+    )
+    parser.add_argument(
+        "--record",
+        help="Record the session to a replay log (see replay.py)",
     )
     optarg = parser.parse_args()
-    main(game_map.Map("maps/reversed_mst_campus.txt"), **optarg.__dict__)
+    map_file_name = "maps/reversed_mst_campus.txt"
+    seed = None
+    if optarg.record is not None:
+        seed = replay.record(optarg.record, map_file_name).seed
+    rq_map = game_map.Map(map_file_name, scroll=optarg.scroll, seed=seed)
+    del optarg.record, optarg.scroll
+    main(rq_map, **optarg.__dict__)
 
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Counter-based random streams.
+
+Draw n of a stream is a pure function of (seed, stream key, n), using the
+SplitMix64 finalizer as the mixing function. Streams never share state, so
+the order in which entities or subsystems draw from their own streams can't
+change what any of them get, and a batch of draws across many streams gives
+exactly what drawing from each stream in turn would.
+
+Stream mirrors the parts of the random module the game uses (random,
+randrange, randint, choice), so it can stand in for it. Source is that
+shared part, for code that takes either.
+"""
+
+import hashlib
+import random as _random
+from typing import Hashable, List, Optional, Protocol, Sequence, TypeVar
+
+T = TypeVar("T")
+
+MASK = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+
+
+def _mix(z: int) -> int:
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+def _key_hash(key: Hashable) -> int:
+    # hash() is salted per process, so derive a stable 64-bit key instead
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class Source(Protocol):
+    """What a Stream and the random module both provide"""
+
+    def random(self) -> float: ...
+
+    def randrange(self, start: int, stop: Optional[int] = None) -> int: ...
+
+    def randint(self, a: int, b: int) -> int: ...
+
+    def choice(self, seq: Sequence[T]) -> T: ...
+
+
+class Stream:
+    """One independent stream. counter is the index of the next draw."""
+
+    __slots__ = ("base", "counter")
+
+    def __init__(self, base: int, counter: int = 0) -> None:
+        self.base = base
+        self.counter = counter
+
+    def next64(self) -> int:
+        z = (self.base + self.counter * GOLDEN) & MASK
+        self.counter += 1
+        return _mix(z)
+
+    def random(self) -> float:
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def randrange(self, start: int, stop: Optional[int] = None) -> int:
+        if stop is None:
+            start, stop = 0, start
+        n = stop - start
+        if n <= 0:
+            raise ValueError(f"empty range for randrange({start}, {stop})")
+        # Multiply-shift maps the 64-bit draw onto [0, n)
+        return start + ((self.next64() * n) >> 64)
+
+    def randint(self, a: int, b: int) -> int:
+        return self.randrange(a, b + 1)
+
+    def choice(self, seq: Sequence[T]) -> T:
+        if not seq:
+            raise IndexError("cannot choose from an empty sequence")
+        return seq[self.randrange(len(seq))]
+
+
+class RandomStreams:
+    """Seeded source of named streams, e.g. one per entity and subsystem"""
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        if seed is None:
+            seed = _random.SystemRandom().getrandbits(64)
+        self.seed = seed & MASK
+
+    def stream(self, key: Hashable) -> Stream:
+        return Stream(_mix(self.seed ^ _key_hash(key)))
+
+
+def randrange_batch(streams: Sequence[Stream], n: int) -> List[int]:
+    """randrange(n) on every stream, in one pass"""
+    if n <= 0:
+        raise ValueError(f"empty range for randrange({n})")
+    out = [0] * len(streams)
+    for i, s in enumerate(streams):
+        z = (s.base + s.counter * GOLDEN) & MASK
+        s.counter += 1
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+        out[i] = ((z ^ (z >> 31)) * n) >> 64
+    return out
+
+
+def choice_batch(streams: Sequence[Stream], seq: Sequence[T]) -> List[T]:
+    """choice(seq) on every stream, in one pass"""
+    return [seq[i] for i in randrange_batch(streams, len(seq))]
@@ -14,6 +14,14 @@ class UserOptions:
     res: Res = Res.R256x144,
     logconf: str = "logging.json"
     renderscale: int = 1
+    # Drop the render resolution below res when frames take longer than
+    # target_frame_time seconds to render. Off unless asked for, in the menu
+    # or with --adaptive-res
+    adaptive_res: bool = False
+    target_frame_time: float = 1 / 30
+    # Cells rays travel before they give out in fog. Adaptive resolution
+    # shortens it once the resolution can't drop any further
+    draw_dist: int = 100
     x_sens: float = 0.25
     y_sens: float = 0.25
 
@@ -39,8 +47,13 @@ def get_user_options():
     )
     opt = user_options()
     
+    adaptive = tk.BooleanVar(frame, value=opt.adaptive_res)
+    draw_dist = tk.IntVar(frame, value=opt.draw_dist)
+
     def set_user_res(dev):
         opt.dev = dev
+        opt.adaptive_res = adaptive.get()
+        opt.draw_dist = draw_dist.get()
         opt.res = {
             str(r): r for r in Res
         }.get(optvar.get(), Res.R256x144)
@@ -60,6 +73,20 @@ def get_user_options():
     bt_start.pack(side=tk.LEFT, fill=tk.X)
     bt_dev.pack(side=tk.LEFT)
     res_menu.pack(expand=True, fill=tk.BOTH)
+    tk.Checkbutton(
+        master=frame,
+        text="adaptive resolution",
+        variable=adaptive,
+    ).pack(expand=True, fill=tk.BOTH)
+    tk.Scale(
+        master=frame,
+        label="draw distance",
+        variable=draw_dist,
+        from_=20,
+        to=250,
+        resolution=10,
+        orient=tk.HORIZONTAL,
+    ).pack(expand=True, fill=tk.BOTH)
     bt_frame.pack(expand=True, fill=tk.BOTH)
     optvar.set(list(Res)[0])
     frame.pack(expand=True)
@@ -134,14 +161,16 @@ def init_game_ui():
     )
     def on_escape_1(event):
         root_win.push_escape(on_escape_2)
-        # Show the menu, and release io lock
+        # Show the menu, release io lock and stop rendering under it
         menu.lift()
         viewport.release()
+        root_win.paused = True
 
     def on_escape_2(event):
         root_win.push_escape(on_escape_1)
         menu.lower()
         viewport.acquire()
+        root_win.paused = False
 
     root_win.push_escape(on_escape_1)
     return viewport
@@ -157,6 +186,10 @@ def init_dev_ui(
     logviewer = tk_io.TextHandler()
     logviewer.setFormatter(logging.Formatter(fmt_str, "%H:%M:%S"))
     rootlog = logging.getLogger()
+    # The viewer of a previous session went with its window
+    for handler in rootlog.handlers[:]:
+        if isinstance(handler, tk_io.TextHandler):
+            rootlog.removeHandler(handler)
     rootlog.addHandler(logviewer)
 
     def grid_fn():
@@ -174,7 +207,7 @@ def init_dev_ui(
     return grid_fn
 
 
-def bind_keys(viewport: tk_io.IOLock, camera):
+def bind_keys(viewport: "tk_io.IOLock", camera):
     keybinds = game_io.get_user_keybinds()
     root_win = tk_io.root_win()
     up, down, left, right = keybinds["Movement"]
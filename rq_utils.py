@@ -1,13 +1,16 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-import os
+import logging
+import shutil
+import time
 from typing import Tuple, Dict
 
 
 def get_chunk_size() -> Tuple[int, int]:
-    cols, lines = os.get_terminal_size()
-    # Subtract one line for the input prompt and another for the HUD
+    # Falls back to 80x24 when not attached to a terminal (e.g. replays)
+    cols, lines = shutil.get_terminal_size()
+    # Subtract a line each for the input prompt, the HUD and contact messages
     return lines - 3, cols - 1
 
 
@@ -59,3 +62,33 @@ def getch() -> str:
     finally:
         # Reset the terminal once we receive the Ctrl-C
         termios.tcsetattr(stdin_fd, termios.TCSADRAIN, old_cfg)
+
+
+class RateLimit(logging.Filter):
+    """
+    Lets a message through at most once every interval seconds. Messages are
+    told apart by logger, level and format string, so the arguments can vary.
+    The next record let through says how many were dropped in between.
+    """
+
+    def __init__(self, interval: float = 1.0) -> None:
+        super().__init__()
+        self.interval = interval
+        # (logger, level, format string) -> [last let through, dropped since]
+        self._seen: Dict[Tuple[str, int, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        seen = self._seen.get(key)
+        if seen is None:
+            self._seen[key] = [now, 0]
+            return True
+        if now - seen[0] < self.interval:
+            seen[1] += 1
+            return False
+        if seen[1]:
+            # No % in the suffix, so it can't disturb the record's own args
+            record.msg = f"{record.msg} ({seen[1]} more suppressed)"
+        seen[0], seen[1] = now, 0
+        return True
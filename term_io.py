@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import sys
+from typing import Dict, List, Optional, Sequence, Set, TextIO, Tuple
+
+Cells = Dict[Tuple[int, int], str]
+
+
+def _goto(row: int, col: int) -> str:
+    # ANSI cursor positions are 1-based
+    return f"\033[{row + 1};{col + 1}H"
+
+
+class TerminalView:
+    """
+    Draws the text map with cursor-addressed diffs.
+
+    The caller hands over the base lines of the view (already in display
+    order) plus the entity cells overlaid on top of them. Only rows whose base
+    changed and cells whose overlay changed since the last frame are written,
+    and the whole frame goes out in a single write.
+
+    Below the HUD is the message area, with every line of the messages of the
+    last frame that brought any, wrapped to the width of the view. It stays
+    for MESSAGE_FRAMES frames or until newer messages replace it. When it
+    needs more rows than are free, the map gives up its bottom rows to it;
+    lines that still don't fit are elided from the middle, so the first and
+    last lines of a message stay in view.
+    """
+
+    MESSAGE_FRAMES = 50
+
+    def __init__(self, out: Optional[TextIO] = None, rows: int = 0) -> None:
+        self._out = out if out is not None else sys.stdout
+        # Screen rows for the view, HUD and messages; 0 is as many as needed
+        self._rows = rows
+        self._base: List[str] = []
+        self._cells: Cells = {}
+        self._hud: Optional[str] = None
+        self._messages: List[str] = []
+        self._message_frames = 0
+        # First row below the last frame
+        self._bottom = 0
+        self._dirty = True
+
+    def _message_lines(self, messages: Sequence[str], width: int) -> List[str]:
+        lines: List[str] = []
+        for message in messages:
+            for line in message.rstrip("\n").split("\n"):
+                # Split here, a line the terminal wrapped would push the view up
+                lines.extend(line[i : i + width] for i in range(0, len(line), width))
+                if not line:
+                    lines.append("")
+        if self._rows:
+            # Every row but the HUD's
+            room = max(self._rows - 1, 1)
+            if len(lines) > room:
+                head = (room - 1) // 2
+                tail = room - 1 - head
+                elided = f"[... {len(lines) - head - tail} more lines ...]"
+                lines = lines[:head] + [elided[:width]] + lines[len(lines) - tail :]
+        return lines
+
+    def present(
+        self, base: List[str], cells: Cells, hud: str, messages: Sequence[str] = ()
+    ) -> None:
+        buf = []
+        if self._dirty:
+            buf.append("\033[H\033[2J")
+            prev_base: List[str] = []
+            prev_cells: Cells = {}
+            prev_hud = None
+            prev_messages = None
+            prev_bottom = 0
+        else:
+            prev_base, prev_cells, prev_hud = self._base, self._cells, self._hud
+            prev_messages = self._messages
+            prev_bottom = self._bottom
+
+        if messages:
+            width = len(base[0]) if base else len(hud)
+            self._messages = self._message_lines(messages, max(width, 1))
+            self._message_frames = self.MESSAGE_FRAMES
+        elif self._message_frames:
+            self._message_frames -= 1
+            if not self._message_frames:
+                self._messages = []
+        message_lines = self._messages or [""]
+        if self._rows and len(base) + 1 + len(message_lines) > self._rows:
+            # The map makes room for the messages
+            base = base[: max(self._rows - 1 - len(message_lines), 0)]
+            cells = {pos: ch for pos, ch in cells.items() if pos[0] < len(base)}
+
+        redrawn: Set[int] = set()
+        if base is not prev_base:
+            for i, line in enumerate(base):
+                if i >= len(prev_base) or prev_base[i] != line:
+                    buf.append(_goto(i, 0) + line + "\033[K")
+                    redrawn.add(i)
+
+        # Uncover cells that entities left, unless the row was redrawn anyway
+        for i, j in prev_cells:
+            if (i, j) not in cells and i not in redrawn and i < len(base):
+                buf.append(_goto(i, j) + base[i][j])
+        for (i, j), ch in cells.items():
+            if i in redrawn or prev_cells.get((i, j)) != ch:
+                buf.append(_goto(i, j) + ch)
+
+        moved = len(base) != len(prev_base)
+        if hud != prev_hud or moved:
+            buf.append(_goto(len(base), 0) + hud + "\033[K")
+        if self._messages is not prev_messages or moved:
+            for i, line in enumerate(message_lines):
+                buf.append(_goto(len(base) + 1 + i, 0) + line + "\033[K")
+        bottom = len(base) + 1 + len(message_lines)
+        # Blank whatever the last frame left below this one
+        for i in range(bottom, prev_bottom):
+            buf.append(_goto(i, 0) + "\033[K")
+        # Park the cursor below the view
+        buf.append(_goto(bottom, 0))
+
+        self._out.write("".join(buf))
+        self._out.flush()
+        self._base, self._cells, self._hud = base, cells, hud
+        self._bottom = bottom
+        self._dirty = False
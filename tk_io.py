@@ -1,8 +1,11 @@
+import _tkinter
 import abc
 import collections
 import logging
+import math
+import selectors
 import tkinter as tk
-from typing import Callable, List, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 from graphics import Res
 import time
 import functools
@@ -14,9 +17,11 @@ logger = logging.getLogger(__name__)
 KeyPressHandler = Callable[[tk.Event], None]
 
 def debug(fn):
-    def inner(self, event: tk.Event):
-        logger.debug(f"Mouse ({event.x}, {event.y})")
-        fn(self, event)
+    def inner(self, dx: int, dy: int):
+        # Checked up front so nothing is formatted when debug is off
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Mouse (%+d, %+d)", dx, dy)
+        fn(self, dx, dy)
     return inner
 
 
@@ -43,9 +48,52 @@ class IOLock(abc.ABC):
         ...
 
 
+class TkSelector(selectors.DefaultSelector):
+    """
+    Selector for the game's asyncio loop that does its waiting in Tk's event
+    loop. While the loop waits Tk watches the selector itself, so the wait
+    ends as soon as there is window input, I/O (finished renders included)
+    or the loop's timeout runs out, and Tk events are handled as they arrive
+    rather than polled for. Until there's a running window it's a plain
+    selector.
+    """
+
+    def select(self, timeout: Optional[float] = None):
+        win = _root
+        if win is None or not win.running:
+            return super().select(timeout)
+        ready = super().select(0)
+        if ready or (timeout is not None and timeout <= 0):
+            return ready
+        # Only watched for the wait: the selector stays readable until the
+        # loop handles what's ready, which would keep a pump busy
+        fd = self.fileno()
+        win.tk.createfilehandler(fd, _tkinter.READABLE, _ignore)
+        timer = None
+        if timeout is not None:
+            timer = win.tk.createtimerhandler(math.ceil(timeout * 1000), _ignore)
+        try:
+            # One event may be all the loop was waiting for, e.g. one that
+            # unpauses it, so it gets control back after each
+            win.tk.dooneevent()
+        finally:
+            win.tk.deletefilehandler(fd)
+            if timer is not None:
+                timer.deletetimerhandler()
+        win.pump()
+        return super().select(0)
+
+
+def _ignore(*args) -> None:
+    pass
+
+
 class GameWin(tk.Tk):
     """Root window object"""
 
+    # Frames start at most this often
+    FRAME_TIME = 1 / 60
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         global _root
@@ -53,6 +101,9 @@ class GameWin(tk.Tk):
         self._escape_stack = collections.deque()
         self._running = True
         self._loop = asyncio.get_event_loop()
+        # Set while frames should be rendered, i.e. not paused
+        self._rendering = asyncio.Event()
+        self._rendering.set()
         self.bind("<Escape>", self.handle_escape)
         self.bind("<Tab>", self.handle_tab)
         self.on_tab: Callable[[tk.Event], None] = lambda ev: None
@@ -99,25 +150,87 @@ class GameWin(tk.Tk):
         offset_x, offset_y = screen_w // 2 - this_w // 2, screen_h // 2 - this_h // 2
         self.geometry(f"+{offset_x}+{offset_y}")
 
+    @property
+    def running(self) -> bool:
+        """Until the window is destroyed"""
+        return self._running
+
+    @property
+    def paused(self) -> bool:
+        """No frames are rendered while paused, e.g. with the menu open"""
+        return not self._rendering.is_set()
+
+    @paused.setter
+    def paused(self, paused: bool):
+        if paused:
+            self._rendering.clear()
+        else:
+            self._rendering.set()
+
     def destroy(self, reload=False):
         self._running = False
         self._reload = reload
+        # Let a paused frame loop see that it's over
+        self._rendering.set()
         super().destroy()
 
-    def mainloop(self, render: Callable[[], None]):
-        async def _loop():
-            while self._running:
-                render()
-                self.update()
-                await asyncio.sleep(1 / 60)
-            self._loop.stop()
+    def pump(self):
+        """Handle every pending Tk event and idle callback, without waiting"""
+        while self._running and self.tk.dooneevent(_tkinter.DONT_WAIT):
+            pass
+
+    def mainloop(self, render: Callable[[], Awaitable[None]]):
+        """
+        Render frames until the window closes. The asyncio loop should be
+        on a TkSelector, so that input gets to Camera while a frame renders
+        or the loop waits for the next one.
+        """
 
-        task = self._loop.create_task(_loop())
-        self._loop.run_until_complete(task)
+        async def _frames():
+            next_frame = self._loop.time()
+            while self._running:
+                if self.paused:
+                    await self._rendering.wait()
+                    next_frame = self._loop.time()
+                await asyncio.sleep(next_frame - self._loop.time())
+                # Input up to the last moment goes into this frame
+                self.pump()
+                if not self._running or self.paused:
+                    continue
+                # Other tasks run while the frame renders
+                await render()
+                # Get it on screen now, not at the next pump
+                self.pump()
+                # A late frame pushes the schedule back rather than have the
+                # next ones race to catch up
+                next_frame = max(next_frame + self.FRAME_TIME, self._loop.time())
+
+        self._loop.run_until_complete(self._loop.create_task(_frames()))
         if self._reload:
             raise lib_rq.ReloadEvent
 
 
+# Red, green and blue of every palette index, as bytes.translate tables
+PaletteTables = Tuple[bytes, bytes, bytes]
+
+
+def palette_tables(colors: Sequence[Sequence[int]]) -> PaletteTables:
+    """Tables for up to 256 RGB colours, unused indices are black"""
+    colors = list(colors) + [(0, 0, 0)] * (256 - len(colors))
+    red, green, blue = (
+        bytes(color[channel] for color in colors) for channel in range(3)
+    )
+    return red, green, blue
+
+
+def expand(indices: bytes, tables: PaletteTables) -> bytearray:
+    """RGB raster from a raster of palette indices"""
+    rgb = bytearray(3 * len(indices))
+    for channel, table in enumerate(tables):
+        rgb[channel::3] = indices.translate(table)
+    return rgb
+
+
 class PlayerView(tk.Canvas, IOLock):
     def __init__(self, *, res: Res = None, render_scale=1, **kwargs):
         super().__init__(**kwargs)
@@ -125,27 +238,62 @@ class PlayerView(tk.Canvas, IOLock):
         self.width = self["width"] = res.width * render_scale
         self.height = self["height"] = res.height * render_scale
         self["bd"] = -2  # remove canvas border
-        self._prev_img = tk.PhotoImage(width=self.width, height=self.height)
-        self._prev_cnv = self.create_image((0, 0), image=self._prev_img, state="normal")
-        self._on_motion: Callable[[tk.Canvas, tk.Event]] = self._default_handler
+        self._center = self.width // 2, self.height // 2
+        # One image for the life of the view, updated in place every frame
+        self._img = tk.PhotoImage(width=self.width, height=self.height)
+        self._cnv = self.create_image(self._center, image=self._img, state="normal")
+        # Per raster size: the P6 header, the image the raster is put into,
+        # and the zoom from that image to the view
+        self._staging: Dict[Tuple[int, int], Tuple[bytes, tk.PhotoImage, int]] = {}
+        self._on_motion: Callable[[tk.Canvas, int, int], None] = self._default_handler
         self._flag = True
+        # Pointer travel since the last frame, and where it was last seen
+        self._motion = [0, 0]
+        self._last = self._center
+        self._warped = True
 
-        self._center = self.width // 2, self.height // 2
         self.bind("<Motion>", self.handle_motion)
 
     @staticmethod
     @debug
-    def _default_handler(self, ev):
+    def _default_handler(self, dx, dy):
         """Do nothing"""
         pass
 
     def handle_motion(self, ev: tk.Event):
-        w, h = self._center
-        if ev.x == w and ev.y == h:
+        """
+        Add the pointer's travel to this frame's motion. The pointer is only
+        warped back to the centre once a frame, or sooner if it gets close to
+        the edge of the view.
+        """
+        if not self._flag:
             return
-        elif self._flag:
-            self._on_motion(self, ev)
-            self.event_generate("<Motion>", warp=True, x=w, y=h)
+        last_x, last_y = self._last
+        self._motion[0] += ev.x - last_x
+        self._motion[1] += ev.y - last_y
+        self._last = ev.x, ev.y
+        w, h = self._center
+        self._warped = ev.x == w and ev.y == h
+        if abs(ev.x - w) > w // 2 or abs(ev.y - h) > h // 2:
+            self._warp()
+
+    def _warp(self):
+        self._last = self._center
+        self._warped = True
+        x, y = self._center
+        self.event_generate("<Motion>", warp=True, x=x, y=y)
+
+    def apply_motion(self):
+        """
+        Hand the motion since the last call to the on_motion handler in one
+        go. Called once per frame, before the frame is built.
+        """
+        dx, dy = self._motion
+        self._motion = [0, 0]
+        if self._flag and not self._warped:
+            self._warp()
+        if dx or dy:
+            self._on_motion(self, dx, dy)
 
     @property
     def on_motion(self):
@@ -158,29 +306,55 @@ class PlayerView(tk.Canvas, IOLock):
         else:
             self._on_motion = debug(fn)
 
-    def draw(self, data):
-        self.delete(self._prev_cnv)
-        self.delete(self._prev_img)
-
-        img = self._prev_img = tk.PhotoImage(
-            data=b"P6\n%d %d\n255\n%s" % (self.width, self.height, data)
-        )
-        self._prev_cnv = self.create_image(self._center, image=img, state="normal")
+    def draw(
+        self,
+        data,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        palette: Optional[PaletteTables] = None,
+    ):
+        """
+        Present a width x height RGB raster (the view's own size by default).
+        Smaller rasters are zoomed up to fill the view in a single copy.
+        With a palette, data holds a byte per pixel indexing it instead.
+        """
+        if width is None or height is None:
+            width, height = self.width, self.height
+        if (width, height) not in self._staging:
+            zoom = self.width // width
+            staging = (
+                self._img
+                if zoom == 1
+                else tk.PhotoImage(master=self, width=width, height=height)
+            )
+            self._staging[width, height] = (
+                b"P6\n%d %d\n255\n" % (width, height),
+                staging,
+                zoom,
+            )
+        header, staging, zoom = self._staging[width, height]
+        if palette is not None:
+            data = expand(data[: width * height], palette)
+        # Tcl only takes bytes, so this concatenation is the one copy per frame
+        ppm = header + memoryview(data)[: width * height * 3]
+        self.tk.call(staging, "put", ppm, "-format", "ppm")
+        if zoom != 1:
+            self.tk.call(self._img, "copy", staging, "-zoom", zoom, zoom)
 
     def locked(self):
         return self._flag
 
     def acquire(self):
-        x, y = self._center
         self._flag = True
-        self.event_generate("<Motion>", warp=True, x=x, y=y)
+        self._motion = [0, 0]
+        self._warp()
         root_win().config(cursor="none")
-        logger.info(f"io lock acquired")
+        logger.info("io lock acquired")
 
     def release(self):
         self._flag = False
         root_win().config(cursor="")
-        logger.info(f"io lock released")
+        logger.info("io lock released")
 
 
 class MenuWin(tk.Frame):
@@ -284,7 +458,13 @@ class ScrollText(tk.Frame):
 
 
 class TextHandler(ScrollText, logging.Handler):
-    """Display log records"""
+    """
+    Display log records. Records are only queued when they're logged (from
+    any thread); the Text widget takes them in one insert per DRAIN_MS.
+    """
+
+    DRAIN_MS = 100
+    MAX_LINES = 1000
 
     def __init__(self, **kwargs):
         super().__init__(height=8, **kwargs)
@@ -292,20 +472,41 @@ class TextHandler(ScrollText, logging.Handler):
         self.txt["state"] = tk.DISABLED
         self.txt["bg"] = "grey26"
         self.txt["fg"] = "white"
+        # deque appends and pops are atomic, so emit doesn't need the Tk thread
+        self._pending = collections.deque()
+        self._drain_id = self.after(self.DRAIN_MS, self._drain)
 
     def emit(self, record):
-        message = self.format(record) + "\n"
-        self.txt["state"] = tk.NORMAL
-        self.txt.insert(tk.END, message)
-        self.txt.see(tk.END)
-        self.txt["state"] = tk.DISABLED
+        try:
+            self._pending.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def _drain(self):
+        messages = []
+        while self._pending:
+            messages.append(self._pending.popleft())
+        if messages:
+            self.txt["state"] = tk.NORMAL
+            self.txt.insert(tk.END, "\n".join(messages) + "\n")
+            # Keep the widget from growing without bound
+            excess = int(self.txt.index("end-1c").split(".")[0]) - self.MAX_LINES
+            if excess > 0:
+                self.txt.delete("1.0", f"{excess + 1}.0")
+            self.txt.see(tk.END)
+            self.txt["state"] = tk.DISABLED
+        self._drain_id = self.after(self.DRAIN_MS, self._drain)
+
+    def destroy(self):
+        self.after_cancel(self._drain_id)
+        super().destroy()
 
 
 class GameMenu(tk.Frame):
     """
     Help:   Show the help window
     Quit:   exit the program
-    Reload: exit the program and restart
+    Reload: start a new game
     """
 
     def __init__(self, **kwargs):
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Temporarily add the current path to the system path for importing the student's source code.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".admin_files"
+    )
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# python3 seemingly respects only abspaths, while ipython3 is ok with relative, like '..' here.
+import test_utils
+
+
+@test_utils.test_wrapper
+def test() -> bool:
+    import random
+    from game_map import FreeCellIndex
+
+    # A walled 20x30 room with a pillar in the middle
+    lines = ["W" * 30] + ["W" + " " * 28 + "W" for _ in range(18)] + ["W" * 30]
+    lines[10] = "W" + " " * 13 + "||" + " " * 13 + "W"
+    index = FreeCellIndex(lines)
+    result = len(index) == 18 * 28 - 2
+
+    # Every free cell exactly once, and only free cells
+    cells = index.sampler(rng=random.Random(1)).take(len(index))
+    result = result and len(set(cells)) == len(index)
+    result = result and all(lines[i][j] == " " for i, j in cells)
+
+    # Reserved cells are never handed out
+    reserved = [(1, 1), (5, 5), (18, 28)]
+    sampler = index.sampler(reserved=reserved, rng=random.Random(2))
+    cells = sampler.take(len(index) - len(reserved))
+    result = result and not set(reserved) & set(cells)
+
+    # Picks keep their distance from each other
+    spacing = 4
+    cells = index.sampler(min_spacing=spacing, rng=random.Random(3)).take(12)
+    result = result and all(
+        max(abs(a[0] - b[0]), abs(a[1] - b[1])) >= spacing
+        for n, a in enumerate(cells)
+        for b in cells[n + 1 :]
+    )
+
+    # Asking for more than there is runs out
+    try:
+        index.sampler(min_spacing=10, rng=random.Random(4)).take(len(index))
+        result = False
+    except ValueError:
+        pass
+    return result
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Temporarily add the current path to the system path for importing the student's source code.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".admin_files"
+    )
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# python3 seemingly respects only abspaths, while ipython3 is ok with relative, like '..' here.
+import test_utils
+
+
+@test_utils.test_wrapper
+def test() -> bool:
+    import asyncio
+    import ctypes
+    import math
+    import game_map
+    import lib_rq
+    import rq_engine
+    from game_io import EventPlayer
+    from graphics import Res
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rq_map = game_map.Map(os.path.join(root, "maps/reversed_mst_campus.txt"), seed=7)
+    players = [EventPlayer(entity, map=rq_map) for entity in rq_map.entities]
+    lib_rq.Camera.bind(players[0])
+    player = rq_map.player
+
+    # Crowd some entities around the player, where the camera can see them,
+    # then let everything move for a while
+    free = [
+        (row, col)
+        for row in range(player.row - 12, player.row + 13)
+        for col in range(player.col - 12, player.col + 13)
+        if rq_map.lines[row][col] == " " and (row, col) != (player.row, player.col)
+    ]
+    for entity, (row, col) in zip(rq_map.entities[1:], free[::7]):
+        entity.row, entity.col = row, col
+    for _ in range(5):
+        rq_map.move_all(draw=False)
+
+    dump = rq_map.byte_dump()
+    rows, cols = rq_map.height, rq_map.width
+    # The pyramid kept up with every move
+    fresh = game_map.OccupancyPyramid(rows, cols, dump)
+    result = fresh.data == rq_map.occupancy.data
+
+    camera = lib_rq.Camera
+    camera.POSITION = [player.col + 0.5, 0.0, player.row + 0.5]
+    camera_size = ctypes.sizeof(camera)
+
+    def render(accel: str, data: bytes) -> bytes:
+        kernel_args = rq_engine.KernelArgs(rq_map, accel)
+        frames = b""
+        with rq_engine.RenderEngine(
+            Res.R128x72, 1, kernel_args.size, kernel_args, "thread"
+        ) as gpu:
+            gpu.timeout = None
+            data_in, data_out = bytearray(), bytearray()
+            for k in range(4):
+                camera.FACING = [k * math.pi / 2 + 0.3, 0.1, 0.0]
+                data_in[:] = bytes(camera()) + dump + data
+                gpu(data_in, data_out)
+                frames += bytes(data_out)
+        return frames
+
+    # A field of zeros steps every ray a cell at a time
+    brute = render("field", bytes(rows * cols))
+    result = result and render("field", rq_map.distance_field.update(dump)) == brute
+    result = result and render("pyramid", rq_map.occupancy.data) == brute
+    return result
+
+
+if __name__ == "__main__":
+    test()
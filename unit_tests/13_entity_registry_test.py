@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Temporarily add the current path to the system path for importing the student's source code.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".admin_files"
+    )
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# python3 seemingly respects only abspaths, while ipython3 is ok with relative, like '..' here.
+import test_utils
+
+
+@test_utils.test_wrapper
+def test() -> bool:
+    import asyncio
+    import random
+    import characters
+    import game_map
+    import lib_rq
+    from entity_registry import INDEX, TYPE_INDEX
+    from game_io import EventPlayer
+
+    def consistent(registry, entities) -> bool:
+        # Every live entity sits where its slot says, in both lists
+        return sorted(e.uid for e in registry.live) == sorted(
+            e.uid for e in entities
+        ) and all(
+            registry.registered(e)
+            and registry.live[e.registry_slot[INDEX]] is e
+            and registry.of_type(type(e))[e.registry_slot[TYPE_INDEX]] is e
+            for e in entities
+        )
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    map_file = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "maps/reversed_mst_campus.txt",
+    )
+    first = game_map.Map(map_file, seed=1)
+    players = [EventPlayer(entity, map=first) for entity in first.entities]
+    lib_rq.Camera.bind(players[0])
+    entities = list(first.entities)
+    result = len({e.uid for e in entities}) == len(entities)
+    result = result and consistent(first.registry, entities)
+
+    # Neither a second map nor an entity made outside add_entity() joins
+    second = game_map.Map(map_file, seed=2)
+    stray = characters.AntiCipher(first.player.row, first.player.col, first.player)
+    result = result and consistent(first.registry, entities)
+    result = result and all(e.registry is second.registry for e in second.entities)
+    result = result and stray.registry is None and stray not in first.entities
+    result = result and first.move_all(draw=False) is not None
+
+    # Take out a random half, some of them twice
+    gone = random.sample(entities[1:], len(entities) // 2)
+    for entity in gone + gone[:5]:
+        entity.active = False
+    kept = [e for e in entities if e not in gone]
+    result = result and consistent(first.registry, kept)
+    removed = first.registry.take_removed()
+    result = result and sorted(e.uid for e in removed) == sorted(e.uid for e in gone)
+    result = result and all(e.registry_slot is None for e in gone)
+    result = result and not first.registry.take_removed()
+
+    # Smiths see the Smiths of their own map; ones a test made see each other
+    smith = next(e for e in kept if type(e) is characters.AdminSmith)
+    result = result and smith.adminsmiths == first.registry.of_type(
+        characters.AdminSmith
+    )
+    made = [characters.AdminSmith(200, 200 + i) for i in range(3)]
+    result = result and sorted(map(id, characters.AdminSmith.adminsmiths)) == sorted(
+        map(id, made)
+    )
+
+    # Another map's registry leaves the smith alone; its own takes it out and
+    # back in, at the end of both lists
+    second.registry.discard(smith)
+    result = result and consistent(first.registry, kept)
+    result = result and not second.registry.take_removed()
+    first.registry.discard(smith)
+    kept.remove(smith)
+    result = result and consistent(first.registry, kept)
+    first.registry.register(smith)
+    kept.append(smith)
+    result = result and consistent(first.registry, kept)
+    result = result and smith.registry_slot == [
+        len(first.registry.live) - 1,
+        len(first.registry.of_type(characters.AdminSmith)) - 1,
+    ]
+    return result
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Temporarily add the current path to the system path for importing the student's source code.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".admin_files"
+    )
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# python3 seemingly respects only abspaths, while ipython3 is ok with relative, like '..' here.
+import test_utils
+
+
+@test_utils.test_wrapper
+def test() -> bool:
+    import random
+    import game_map
+    from pathfinding import MOVES
+    from rq_utils import KEY_DICT
+
+    rq_map = game_map.Map(
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "maps/reversed_mst_campus.txt",
+        ),
+        seed=5,
+    )
+    paths = rq_map.paths
+    offsets = {move: (d_row, d_col) for d_row, d_col, move in MOVES}
+    walkable = [
+        (row, col)
+        for row in range(paths.height)
+        for col in range(paths.width)
+        if paths.is_walkable(row, col)
+    ]
+    result = set(offsets) == {KEY_DICT[k] for k in ("up", "left", "down", "right")}
+    for _ in range(8):
+        goal = random.choice(walkable)
+        field = paths.field(*goal)
+        for start in random.sample(walkable, 8):
+            dist = field.distance(*start)
+            path = paths.path(start, goal, max_visits=len(walkable))
+            # BFS and A* agree on whether there's a way and how long it is
+            if path is None or dist is None:
+                result = result and path is None and dist is None
+                continue
+            result = result and len(path) - 1 == dist
+            result = result and path[0] == start and path[-1] == goal
+            result = result and all(paths.is_walkable(*cell) for cell in path)
+            result = result and all(
+                abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(path, path[1:])
+            )
+            # Following the field gets there in as many steps, all of them
+            # onto open cells
+            cell = start
+            for _ in range(dist):
+                d_row, d_col = offsets[field.step(*cell)]
+                cell = (cell[0] + d_row, cell[1] + d_col)
+                result = result and paths.is_walkable(*cell)
+            result = result and cell == goal and field.step(*cell) is None
+    return result
+
+
+if __name__ == "__main__":
+    test()
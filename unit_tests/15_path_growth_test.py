@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Temporarily add the current path to the system path for importing the student's source code.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".admin_files"
+    )
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# python3 seemingly respects only abspaths, while ipython3 is ok with relative, like '..' here.
+import test_utils
+
+
+@test_utils.test_wrapper
+def test() -> bool:
+    import random
+    import game_map
+    from pathfinding import MOVES, FlowField
+
+    rq_map = game_map.Map(
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "maps/reversed_mst_campus.txt",
+        ),
+        seed=5,
+    )
+    paths = rq_map.paths
+    offsets = {move: (d_row, d_col) for d_row, d_col, move in MOVES}
+    walkable = [
+        (row, col)
+        for row in range(paths.height)
+        for col in range(paths.width)
+        if paths.is_walkable(row, col)
+    ]
+
+    def chase(hunter, target):
+        """Moves the hunter takes to the target, None if it gets lost"""
+        for moves in range(paths.width * paths.height):
+            if hunter == target:
+                return moves
+            move = paths.step(*hunter, target)
+            if move is None:
+                return None
+            hunter = (hunter[0] + offsets[move][0], hunter[1] + offsets[move][1])
+        return None
+
+    result = True
+    for _ in range(8):
+        start = random.choice(walkable)
+        far = [
+            cell
+            for cell in random.sample(walkable, 200)
+            if (paths.field(*start).distance(*cell) or 0) > 40
+        ]
+        if len(far) < 2:
+            continue
+        hunter = far[0]
+        away = paths.path(start, far[-1], max_visits=len(walkable))
+        if away is None:
+            continue
+        # The target walks away a cell at a time, asking for a step at every
+        # cell on the way. Each one is along a shortest path
+        for target in away[1:20]:
+            fresh = FlowField(paths, target).distance(*hunter)
+            move = paths.step(*hunter, target)
+            d_row, d_col = offsets[move]
+            after = (hunter[0] + d_row, hunter[1] + d_col)
+            result = result and fresh is not None
+            result = result and FlowField(paths, target).distance(*after) == fresh - 1
+        moves = chase(hunter, target)
+        result = result and moves == FlowField(paths, target).distance(*hunter)
+
+        # A field searches only as far as it's been asked about
+        field = FlowField(paths, target)
+        near = away[away.index(target) - 1]
+        result = result and field.distance(*near) == 1 and len(field.levels) == 2
+        result = result and field.distance(*hunter) == len(field.levels) - 1
+    return result
+
+
+if __name__ == "__main__":
+    test()
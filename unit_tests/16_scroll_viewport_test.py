@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Temporarily add the current path to the system path for importing the student's source code.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".admin_files"
+    )
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# python3 seemingly respects only abspaths, while ipython3 is ok with relative, like '..' here.
+import test_utils
+
+
+@test_utils.test_wrapper
+def test() -> bool:
+    import asyncio
+    import io
+    import random
+    import game_map
+    import lib_rq
+    import term_io
+    from game_io import EventPlayer
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    rq_map = game_map.Map(
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "maps/reversed_mst_campus.txt",
+        ),
+        scroll=True,
+        seed=4,
+    )
+    players = [EventPlayer(entity, map=rq_map) for entity in rq_map.entities]
+    lib_rq.Camera.bind(players[0])
+    rows = min(rq_map.chunk_rows, rq_map.height)
+    cols = min(rq_map.chunk_cols, rq_map.width)
+
+    result = True
+    previous = None
+    # Corners and edges as well as anywhere in between, and a few vertical
+    # moves at the same column
+    spots = [(0, 0), (rq_map.height - 1, rq_map.width - 1), (0, rq_map.width - 1)]
+    spots += [
+        (random.randrange(rq_map.height), random.randrange(rq_map.width))
+        for _ in range(20)
+    ]
+    spots += [(spots[-1][0] + k, spots[-1][1]) for k in (1, 2, -3)]
+    for row, col in spots:
+        row = min(max(row, 0), rq_map.height - 1)
+        lines, cells = rq_map.get_viewport(row, col)
+        top = min(max(row - rows // 2, 0), rq_map.height - rows)
+        left = min(max(col - cols // 2, 0), rq_map.width - cols)
+        # The view is the map around the position, mirrored like the chunks
+        expected = [
+            line[left : left + cols][::-1] for line in rq_map.lines[top : top + rows]
+        ]
+        result = result and lines == expected
+        result = result and top <= row < top + rows and left <= col < left + cols
+        in_view = {
+            (e.row - top, cols - 1 - (e.col - left))
+            for e in rq_map.entities
+            if top <= e.row < top + rows and left <= e.col < left + cols
+        }
+        result = result and set(cells) == in_view
+        # Moving up or down the same columns reuses the rows already cut
+        if previous is not None and previous[1] == left:
+            result = result and all(
+                lines[r - top] is previous[2][r - previous[0]]
+                for r in range(max(top, previous[0]), min(top, previous[0]) + rows)
+            )
+        previous = (top, left, lines)
+
+    # The player is drawn in the view pretty_print hands the terminal
+    out = io.StringIO()
+    rq_map.terminal = term_io.TerminalView(out, rows=rows + 2)
+    rq_map.pretty_print()
+    result = result and rq_map.player.char() in out.getvalue()
+    return result
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Temporarily add the current path to the system path for importing the student's source code.
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".admin_files"
+    )
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# python3 seemingly respects only abspaths, while ipython3 is ok with relative, like '..' here.
+import test_utils
+
+
+@test_utils.test_wrapper
+def test() -> bool:
+    import random
+    import game_map
+    import rq_engine
+
+    rq_map = game_map.Map(
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "maps/reversed_mst_campus.txt",
+        ),
+        seed=7,
+    )
+    sight = rq_map.sight
+
+    def stops_ray(row, col):
+        return rq_engine.CELL_KIND[rq_map.protomap[row][col]] is not None
+
+    # Sight stops at exactly the map cells the 3D view's rays stop at
+    cells = [(row, col) for row in range(rq_map.height) for col in range(rq_map.width)]
+    result = all(sight.is_wall(*cell) == stops_ray(*cell) for cell in cells)
+    # ...which isn't the set that blocks movement
+    result = result and any(
+        sight.is_wall(*cell) != (not rq_map.paths.is_walkable(*cell)) for cell in cells
+    )
+
+    def line(start, end):
+        """Cells strictly between start and end, walked from the smaller end"""
+        (row, col), (end_row, end_col) = min(start, end), max(start, end)
+        d_row, d_col = abs(end_row - row), abs(end_col - col)
+        s_row = 1 if end_row > row else -1
+        s_col = 1 if end_col > col else -1
+        err = d_col - d_row
+        between = []
+        while True:
+            e2 = 2 * err
+            if e2 > -d_row:
+                err -= d_row
+                col += s_col
+            if e2 < d_col:
+                err += d_col
+                row += s_row
+            if (row, col) == (end_row, end_col):
+                return between
+            between.append((row, col))
+
+    open_cells = [cell for cell in cells if not stops_ray(*cell)]
+    for origin in random.sample(open_cells, 20):
+        targets = [
+            cell
+            for cell in random.sample(open_cells, 400)
+            if abs(cell[0] - origin[0]) + abs(cell[1] - origin[1]) < 40
+        ]
+        expected = [
+            not any(stops_ray(*cell) for cell in line(origin, target))
+            for target in targets
+        ]
+        result = result and sight.visible(origin, targets) == expected
+        # Asked again, from the cache, and the other way round
+        result = result and sight.visible(origin, targets) == expected
+        result = result and all(
+            sight.can_see(target, origin) == seen
+            for target, seen in zip(targets, expected)
+        )
+    return result
+
+
+if __name__ == "__main__":
+    test()
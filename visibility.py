@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Line of sight between cells of a map.
+
+The cells that block sight are the ones a ray of the 3D view stops at:
+walls, bounds and the characters drawn as sprites, so an entity sees what
+the view from its cell would show of the map. Entities and the letters of
+building labels don't, unless a letter is also a sprite's character. This
+is not the set that blocks movement: some letters block one and not the
+other. Walls are packed one int per row (bit col), and a line is
+walked cell by cell with Bresenham's algorithm. Lines are always walked
+from the smaller end, so A sees B exactly when B sees A.
+
+Walls never change, so an answer never goes stale. The answers from the
+last HOT_CELLS origins asked about are kept, which covers the cells that
+entities stand on and get asked about tick after tick.
+"""
+
+import collections
+from typing import Container, Dict, List, Sequence, Tuple
+
+Cell = Tuple[int, int]
+
+
+class Visibility:
+    HOT_CELLS = 64
+
+    def __init__(self, lines: Sequence[str], opaque: Container[str]) -> None:
+        self.height, self.width = len(lines), len(lines[0])
+        self._walls = [
+            int("".join("1" if ch in opaque else "0" for ch in reversed(line)), 2)
+            for line in lines
+        ]
+        # origin -> {target: visible}, most recently used last
+        self._seen: "collections.OrderedDict[Cell, Dict[Cell, bool]]" = (
+            collections.OrderedDict()
+        )
+
+    def is_wall(self, row: int, col: int) -> bool:
+        return bool((self._walls[row] >> col) & 1)
+
+    def _clear(self, start: Cell, end: Cell) -> bool:
+        """Whether every cell strictly between start and end is open"""
+        if end < start:
+            start, end = end, start
+        (row, col), (end_row, end_col) = start, end
+        d_row, d_col = abs(end_row - row), abs(end_col - col)
+        s_row = 1 if end_row > row else -1
+        s_col = 1 if end_col > col else -1
+        err = d_col - d_row
+        walls = self._walls
+        while True:
+            e2 = 2 * err
+            if e2 > -d_row:
+                err -= d_row
+                col += s_col
+            if e2 < d_col:
+                err += d_col
+                row += s_row
+            if row == end_row and col == end_col:
+                return True
+            if (walls[row] >> col) & 1:
+                return False
+
+    def _answers(self, origin: Cell) -> Dict[Cell, bool]:
+        seen = self._seen.get(origin)
+        if seen is None:
+            seen = self._seen[origin] = {origin: True}
+            if len(self._seen) > self.HOT_CELLS:
+                self._seen.popitem(last=False)
+        else:
+            self._seen.move_to_end(origin)
+        return seen
+
+    def can_see(self, origin: Cell, target: Cell) -> bool:
+        return self.visible(origin, [target])[0]
+
+    def visible(self, origin: Cell, targets: Sequence[Cell]) -> List[bool]:
+        """Whether origin can see each of targets"""
+        seen = self._answers(origin)
+        out = []
+        for target in targets:
+            visible = seen.get(target)
+            if visible is None:
+                visible = seen[target] = self._clear(origin, target)
+            out.append(visible)
+        return out